@@ -1,14 +1,14 @@
+import os
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
-from model.RAG import RAG
-from model.Embedding import EmbeddingModel
-from model.LLM import GeminiLLM
-from data.preprocessing import load_chunk
+from typing import Dict, List, Optional
+from model.Metrics import REGISTRY, TTFT_SECONDS
+from model.Admission import AdmissionRejected, ClientGone
+import chat_pipeline as pipeline
 from uuid import uuid4
-import traceback
+import asyncio
+import time
 import uvicorn
 import json
 
@@ -28,201 +28,305 @@ app = FastAPI(
 #     allow_headers=["*"],
 # )
 
-rag_system = None
-embedding_model = None
-llm = None
+class ClientConnection:
+    """
+    One WebSocket with its own sender task, in-flight requests and idle reaper.
+
+    Frames go through a bounded outbound queue: a request whose client reads
+    slowly waits on send() instead of buffering without limit, and a client
+    that stops reading for WS_SEND_TIMEOUT seconds is disconnected. Requests
+    run as separate tasks keyed by request_id, so the reader keeps handling
+    new messages and cancel frames while answers are generated.
+    """
+    
+    def __init__(self, websocket: WebSocket, session_id: str):
+        self.websocket = websocket
+        self.session_id = session_id
+        self.outbound: asyncio.Queue = asyncio.Queue(maxsize=int(os.getenv("WS_OUTBOUND_QUEUE", "64")))
+        self.send_timeout = float(os.getenv("WS_SEND_TIMEOUT", "30"))
+        self.idle_timeout = float(os.getenv("WS_IDLE_TIMEOUT", "300"))
+        self.max_inflight = int(os.getenv("WS_MAX_INFLIGHT", "4"))
+        self.requests: Dict[str, asyncio.Task] = {}
+        self.closed = asyncio.Event()
+        self.last_activity = time.monotonic()
+        self.tasks = [asyncio.create_task(self._sender())]
+        if self.idle_timeout > 0:
+            self.tasks.append(asyncio.create_task(self._reaper()))
+    
+    def touch(self):
+        self.last_activity = time.monotonic()
+    
+    async def is_closed(self) -> bool:
+        return self.closed.is_set()
+    
+    async def send(self, message: dict):
+        """Queue a frame, waiting while the queue is full; drop the client if it stays full."""
+        if self.closed.is_set():
+            return
+        try:
+            await asyncio.wait_for(self.outbound.put(message), self.send_timeout)
+        except asyncio.TimeoutError:
+            print(f"WebSocket {self.session_id} is not reading, closing")
+            await self.close(1013, "Client is not reading")
+    
+    async def receive(self) -> Optional[str]:
+        """Next text frame, or None once the server has closed the connection."""
+        receive_task = asyncio.create_task(self.websocket.receive_text())
+        closed_task = asyncio.create_task(self.closed.wait())
+        try:
+            await asyncio.wait({receive_task, closed_task}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            receive_task.cancel()
+            raise
+        finally:
+            closed_task.cancel()
+        if not receive_task.done():
+            receive_task.cancel()
+            return None
+        return receive_task.result()
+    
+    def start(self, request_id: str, work) -> asyncio.Task:
+        task = asyncio.create_task(work)
+        self.requests[request_id] = task
+        
+        def done(_):
+            if self.requests.get(request_id) is task:
+                del self.requests[request_id]
+            self.touch()
+        task.add_done_callback(done)
+        return task
+    
+    def cancel(self, request_id: Optional[str] = None) -> List[str]:
+        """Cancel one in-flight request, or all of them; return the cancelled ids."""
+        ids = [request_id] if request_id is not None else list(self.requests)
+        cancelled = []
+        for rid in ids:
+            task = self.requests.get(rid)
+            if task is not None and not task.done():
+                task.cancel()
+                cancelled.append(rid)
+        return cancelled
+    
+    async def _sender(self):
+        try:
+            while True:
+                message = await self.outbound.get()
+                await self.websocket.send_json(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # The socket is gone; stop the requests still writing to it
+            await self.close()
+    
+    async def _reaper(self):
+        interval = min(self.idle_timeout, 30)
+        while not self.closed.is_set():
+            await asyncio.sleep(interval)
+            if not self.requests and time.monotonic() - self.last_activity > self.idle_timeout:
+                print(f"WebSocket {self.session_id} idle, closing")
+                await self.close(1000, "Idle timeout")
+    
+    async def close(self, code: int = 1000, reason: str = ""):
+        if self.closed.is_set():
+            return
+        self.closed.set()
+        self.cancel()
+        current = asyncio.current_task()
+        for task in self.tasks:
+            if task is not current:
+                task.cancel()
+        try:
+            await self.websocket.close(code, reason)
+        except Exception:
+            # Already closed by the client
+            pass
 
-conversation_store: dict = {}
 
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: dict[str, WebSocket] = {}
+        self.active_connections: dict[str, ClientConnection] = {}
     
-    async def connect(self, websocket: WebSocket, session_id: str):
+    async def connect(self, websocket: WebSocket, session_id: str) -> ClientConnection:
         await websocket.accept()
-        self.active_connections[session_id] = websocket
+        connection = ClientConnection(websocket, session_id)
+        self.active_connections[session_id] = connection
+        return connection
     
-    def disconnect(self, session_id: str):
-        if session_id in self.active_connections:
+    def disconnect(self, session_id: str, connection: Optional[ClientConnection] = None):
+        # A reconnect under the same session_id may already have replaced this connection
+        if session_id in self.active_connections and connection in (None, self.active_connections[session_id]):
             del self.active_connections[session_id]
     
     async def send_message(self, message: dict, session_id: str):
         if session_id in self.active_connections:
-            await self.active_connections[session_id].send_json(message)
+            await self.active_connections[session_id].send(message)
 
 manager = ConnectionManager()
+REGISTRY.gauge("chatbot_websocket_connections", "Open WebSocket connections", lambda: len(manager.active_connections))
+
+# /, /health, /ready, /metrics, /admin/reload, /chat and /chat/stream
+app.include_router(pipeline.router)
 
-class ChatMessage(BaseModel):
-    role: str
-    content: str
 
-class ChatRequest(BaseModel):
-    message: str
-    session_id: Optional[str] = None
+@app.on_event("startup")
+async def startup_event():
+    # Return at once so the port is bound; models load in the background
+    pipeline.start_warm_up()
 
-class ChatResponse(BaseModel):
-    response: str
-    session_id: str
 
-class HealthResponse(BaseModel):
-    status: str
-    message: str
+async def relay_stream(connection: ClientConnection, request_id: str, deltas):
+    """Forward answer deltas to the socket; return the full text and time-to-first-token in ms."""
+    started = time.perf_counter()
+    ttft_ms = None
+    parts = []
+    async for delta in deltas:
+        if ttft_ms is None:
+            ttft_ms = round((time.perf_counter() - started) * 1000, 1)
+            TTFT_SECONDS.observe(ttft_ms / 1000, "websocket")
+        parts.append(delta)
+        await connection.send({"delta": delta, "status": "streaming", "request_id": request_id})
+    return "".join(parts), ttft_ms
 
-sample_chunks = []
 
-@app.on_event("startup")
-async def startup_event():
-    global rag_system, embedding_model, llm, sample_chunks
+async def answer_message(connection: ClientConnection, request_id: str, message_data: dict):
+    """Answer one chat frame; runs as its own task so the connection keeps reading."""
+    session_id = connection.session_id
+    user_message = message_data["message"]
+    try:
+        admitted = await pipeline.admission.acquire(session_id, connection.is_closed)
+    except AdmissionRejected as e:
+        await connection.send({"error": e.detail, "status": "rejected", "retry_after": e.retry_after, "request_id": request_id})
+        return
+    except ClientGone:
+        return
+    
+    trace = pipeline.tracer.start("websocket")
+    status = "error"
     try:
-        print("Embedding Model loading...")
-        embedding_model = EmbeddingModel()
+        with trace.stage("history"):
+            history = await pipeline.load_history(session_id, user_message)
         
-        print("RAG loading...")
-        rag_system = RAG()
+        await connection.send({"status": "processing", "request_id": request_id})
         
-        print("LLM loading...")
-        llm = GeminiLLM()
+        filters = message_data.get("filters")
+        faq_match, query_embedding = await pipeline.match_faq(user_message, trace, filters)
+        if faq_match is not None:
+            deltas = pipeline.faq_stream(faq_match)
+        else:
+            relevant_chunks, query_embedding = await pipeline.retrieve_chunks(user_message, trace, filters, query_embedding)
+            deltas = pipeline.stream_answer(user_message, relevant_chunks, history, query_embedding, trace)
         
-        print("Chunks loading...")
-        system_chunks, question_chunks = await load_chunk(embedding_model)
-        sample_chunks = system_chunks + question_chunks
-        sample_chunks = [{'text': chunk['content'], 
-                        'embedding': embedding_model.encode(str(chunk['metadata']['header']) + str(chunk['metadata']['title']))}
-                        for chunk in sample_chunks]
+        response_text, ttft_ms = await relay_stream(connection, request_id, deltas)
         
-        print(f"Loaded {len(sample_chunks)} chunks")
-        print("Server started successfully")
+        await pipeline.save_turn(session_id, user_message, response_text)
+        
+        await connection.send({
+            "response": response_text,
+            "session_id": session_id,
+            "status": "completed",
+            "ttft_ms": ttft_ms,
+            "answered_by": "faq" if faq_match else "llm",
+            "request_id": request_id
+        })
+        status = "ok"
+    except asyncio.CancelledError:
+        status = "cancelled"
+        raise
     except Exception as e:
-        print(f"Initialization error: {e}")
-        traceback.print_exc()
+        await connection.send({"error": str(e), "request_id": request_id})
+    finally:
+        pipeline.admission.release(admitted)
+        pipeline.tracer.finish(trace, status)
+
 
 @app.websocket("/v1/chat/{session_id}")
 async def websocket_endpoint(websocket: WebSocket, session_id: str):
-    global rag_system, sample_chunks, conversation_store, llm, embedding_model
-    
+    """
+    Chat over a WebSocket with several requests in flight.
+
+    Client frames are {"message", "filters"?, "request_id"?}, {"type": "cancel",
+    "request_id"?} (no id cancels everything in flight) and {"type": "ping"}.
+    Every reply frame carries the request_id it belongs to; one is generated
+    when the client sends none.
+    """
     origin = websocket.headers.get("origin", "unknown")
     print(f"WebSocket request from origin: {origin}")
     
     try:
-        await manager.connect(websocket, session_id)
+        connection = await manager.connect(websocket, session_id)
         print(f"WebSocket accepted: {session_id}")
     except Exception as e:
         print(f"WebSocket accept failed: {e}")
         return
     
-    if session_id not in conversation_store:
-        conversation_store[session_id] = []
-    
     try:
         while True:
-            data = await websocket.receive_text()
-            message_data = json.loads(data)
-            user_message = message_data.get("message", "")
-            
-            if not user_message.strip():
-                await manager.send_message({"error": "Message cannot be empty"}, session_id)
+            data = await connection.receive()
+            if data is None:
+                break
+            connection.touch()
+            try:
+                message_data = json.loads(data)
+            except ValueError:
+                await connection.send({"error": "Invalid JSON"})
+                continue
+            if not isinstance(message_data, dict):
+                await connection.send({"error": "Frame must be a JSON object"})
                 continue
+            frame_type = message_data.get("type", "message")
+            request_id = message_data.get("request_id")
             
-            if llm is None or rag_system is None:
-                await manager.send_message({"error": "Server is starting"}, session_id)
+            if frame_type == "ping":
+                await connection.send({"type": "pong"})
                 continue
             
-            history = conversation_store[session_id]
-            history.append({"role": "user", "content": user_message})
+            if frame_type == "cancel":
+                cancelled = connection.cancel(str(request_id) if request_id is not None else None)
+                if request_id is not None and not cancelled:
+                    await connection.send({"error": "No such request in flight", "request_id": request_id})
+                for rid in cancelled:
+                    await connection.send({"status": "cancelled", "request_id": rid})
+                continue
             
-            await manager.send_message({"status": "processing"}, session_id)
+            request_id = str(request_id) if request_id is not None else str(uuid4())
             
-            if rag_system and sample_chunks:
-                relevant_chunks = await rag_system.retrieve(
-                    data=user_message,
-                    embedding_model=embedding_model,
-                    chunks=sample_chunks,
-                    top_k=5
-                )
-            else:
-                relevant_chunks = []
+            message = message_data.get("message", "")
+            if not isinstance(message, str):
+                await connection.send({"error": "message must be a string", "request_id": request_id})
+                continue
+            if not message.strip():
+                await connection.send({"error": "Message cannot be empty", "request_id": request_id})
+                continue
             
-            response_text = llm.generate_response(
-                query=user_message,
-                rag_results=relevant_chunks,
-                conversation_history=history
-            )
+            try:
+                pipeline.validate_filters(message_data.get("filters"))
+            except ValueError as e:
+                await connection.send({"error": str(e), "request_id": request_id})
+                continue
             
-            history.append({"role": "assistant", "content": response_text})
+            if not pipeline.startup_state.ready:
+                await connection.send({"error": "Server is starting", "retry_after": pipeline.startup_state.retry_after, "request_id": request_id})
+                continue
             
-            if len(history) > 20:
-                conversation_store[session_id] = history[-20:]
+            if request_id in connection.requests:
+                await connection.send({"error": "request_id is already in flight", "request_id": request_id})
+                continue
             
-            await manager.send_message({
-                "response": response_text,
-                "session_id": session_id,
-                "status": "completed"
-            }, session_id)
+            if len(connection.requests) >= connection.max_inflight:
+                await connection.send({"error": "Too many requests in flight", "status": "rejected", "request_id": request_id})
+                continue
             
+            connection.start(request_id, answer_message(connection, request_id, message_data))
+    
     except WebSocketDisconnect:
-        manager.disconnect(session_id)
         print(f"Client {session_id} disconnected")
     except Exception as e:
-        await manager.send_message({"error": str(e)}, session_id)
-        manager.disconnect(session_id)
-
-
-@app.get("/", response_model=HealthResponse)
-async def root():
-    return HealthResponse(status="ok", message="Chatbot API is working properly")
-
-
-@app.get("/health", response_model=HealthResponse)
-async def health_check():
-    return HealthResponse(status="healthy", message="Server is running normally")
-
-
-
-@app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
-    global rag_system, sample_chunks, conversation_store, llm, embedding_model
-    
-    if not request.message.strip():
-        raise HTTPException(status_code=400, detail="Message cannot be empty")
-    
-    if llm is None or rag_system is None:
-        raise HTTPException(status_code=503, detail="Server is starting")
-    
-    try:
-        session_id = request.session_id or str(uuid4())
-        
-        if session_id not in conversation_store:
-            conversation_store[session_id] = []
-        
-        history = conversation_store[session_id]
-        history.append({"role": "user", "content": request.message})
-        
-        if rag_system and sample_chunks:
-            relevant_chunks = await rag_system.retrieve(
-                data=request.message,
-                embedding_model=embedding_model,
-                chunks=sample_chunks,
-                top_k=5
-            )
-        else:
-            relevant_chunks = []
-        
-        response_text = llm.generate_response(
-            query=request.message,
-            rag_results=relevant_chunks,
-            conversation_history=history
-        )
-        
-        history.append({"role": "assistant", "content": response_text})
-        
-        if len(history) > 20:
-            conversation_store[session_id] = history[-20:]
-        
-        return ChatResponse(response=response_text, session_id=session_id)
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
+        print(f"WebSocket error for {session_id}: {e}")
+    finally:
+        # Stops the requests still in flight for this socket
+        await connection.close()
+        manager.disconnect(session_id, connection)
 
 
 if __name__ == "__main__":
-    uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
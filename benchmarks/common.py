@@ -0,0 +1,55 @@
+import json
+import os
+import numpy as np
+from typing import Dict, List
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def summarize(samples_ms: List[float]) -> Dict[str, float]:
+    if not samples_ms:
+        return {"count": 0}
+    values = np.asarray(samples_ms)
+    return {
+        "count": int(values.size),
+        "mean": round(float(values.mean()), 3),
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+        "p99": round(float(np.percentile(values, 99)), 3),
+    }
+
+
+def print_table(title: str, rows: Dict[str, Dict[str, float]]):
+    print(f"\n{title}")
+    print(f"{'name':<28}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}   (ms)")
+    for name, stats in rows.items():
+        if not stats.get("count"):
+            continue
+        print(f"{name:<28}{stats['count']:>8}{stats['mean']:>10.2f}{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['p99']:>10.2f}")
+
+
+def load_baseline(path: str = BASELINE_PATH) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(section: str, results: dict, path: str = BASELINE_PATH):
+    baseline = load_baseline(path)
+    baseline[section] = results
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare_baseline(section: str, results: dict, tolerance: float, path: str = BASELINE_PATH) -> List[str]:
+    """Return a message for every p95 that regressed by more than tolerance (a fraction)."""
+    reference = load_baseline(path).get(section, {})
+    regressions = []
+    for name, stats in results.items():
+        old = reference.get(name, {}).get("p95")
+        new = stats.get("p95")
+        if old and new and new > old * (1 + tolerance):
+            regressions.append(f"{section}/{name}: p95 {old:.2f}ms -> {new:.2f}ms")
+    return regressions
@@ -0,0 +1,98 @@
+"""
+Deterministic offline stand-ins for the embedding model and Gemini.
+
+Both expose the same interface as the real classes, so the app and RAG run
+unchanged; configurable sleeps approximate real model latency.
+"""
+import time
+import asyncio
+import hashlib
+import numpy as np
+from typing import List, Optional
+
+from model.BM25 import tokenize
+
+
+class FakeEmbeddingModel:
+    """
+    Hashed bag-of-words vectors: every token gets a vector seeded from its
+    hash and a text embeds as their sum, so texts sharing words score as
+    similar and retrieval scores resemble a real model's.
+    """
+
+    def __init__(self, dim: int = 384, batch_latency_ms: float = 0.0, item_latency_ms: float = 0.0):
+        self.model_name = f"fake-embedding-{dim}"
+        self.dim = dim
+        self.batch_latency = batch_latency_ms / 1000
+        self.item_latency = item_latency_ms / 1000
+        self.token_vectors: dict = {}
+
+    def _token_vector(self, token: str) -> np.ndarray:
+        vector = self.token_vectors.get(token)
+        if vector is None:
+            seed = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+            self.token_vectors[token] = vector
+        return vector
+
+    def _vector(self, text: str) -> np.ndarray:
+        tokens = tokenize(text) or [text]
+        return np.sum([self._token_vector(token) for token in tokens], axis=0)
+
+    def encode(self, data: str):
+        return self.encode_batch([data])[0].tolist()
+
+    def encode_batch(self, texts: List[str], batch_size: Optional[int] = None, normalize: bool = False) -> np.ndarray:
+        if self.batch_latency or self.item_latency:
+            time.sleep(self.batch_latency + self.item_latency * len(texts))
+        if not texts:
+            return np.empty((0, self.dim), dtype=np.float32)
+        matrix = np.stack([self._vector(text) for text in texts])
+        if normalize:
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix
+
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _AsyncStream:
+    def __init__(self, parts: List[str], token_latency: float):
+        self.parts = parts
+        self.token_latency = token_latency
+
+    async def __aiter__(self):
+        for part in self.parts:
+            await asyncio.sleep(self.token_latency)
+            yield _Response(part)
+
+
+class FakeLLMBackend:
+    """Gemini GenerativeModel stand-in answering with a fixed text."""
+
+    def __init__(self, first_token_ms: float = 300.0, token_ms: float = 5.0, tokens: int = 60):
+        self.first_token = first_token_ms / 1000
+        self.token_latency = token_ms / 1000
+        self.tokens = tokens
+
+    def _parts(self) -> List[str]:
+        return [f"token{i} " for i in range(self.tokens)]
+
+    def _total(self) -> float:
+        return self.first_token + self.token_latency * self.tokens
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        if stream:
+            time.sleep(self.first_token)
+            return iter(_Response(part) for part in self._parts())
+        time.sleep(self._total())
+        return _Response("".join(self._parts()))
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        if stream:
+            await asyncio.sleep(self.first_token)
+            return _AsyncStream(self._parts(), self.token_latency)
+        await asyncio.sleep(self._total())
+        return _Response("".join(self._parts()))
@@ -0,0 +1,281 @@
+"""
+Offline load test for the chat pipeline.
+
+Replays recorded queries from a JSONL file against POST /chat and, for
+app_2, WS /v1/chat/{session_id}. The app runs in-process with a
+deterministic fake embedding model and a fake LLM, so no network or model
+download is needed. Reports end-to-end latency percentiles, requests per
+second and per-stage timings (encode, retrieve, prompt build, generate).
+
+Usage:
+    python -m benchmarks.load_test --app app_2 --requests 500 --concurrency 32
+    python -m benchmarks.load_test --save-baseline
+    python -m benchmarks.load_test --check-baseline --tolerance 0.25
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+import httpx
+import numpy as np
+from fastapi.testclient import TestClient
+
+from benchmarks.common import compare_baseline, print_table, save_baseline, summarize
+from benchmarks.fakes import FakeEmbeddingModel, FakeLLMBackend
+from data.preprocessing import chunk_embedding_text, iter_corpus, source_paths
+from model.Admission import AdmissionController
+from model.LLM import GeminiLLM
+from model.RAG import RAG
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_QUERIES = [
+    "Làm thế nào để đăng ký tạm trú?",
+    "Cách thêm nhân khẩu mới vào hộ khẩu",
+    "Nút Xóa trong bảng hộ khẩu dùng để làm gì?",
+    "Tôi quên mật khẩu thì phải làm sao?",
+    "Form khai báo tạm vắng gồm những trường nào?",
+]
+
+
+def load_queries(path: str) -> list:
+    """Read queries from JSONL, taking 'message', 'query' or 'title' of each record."""
+    queries = []
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    queries.append(line)
+                    continue
+                if isinstance(record, dict):
+                    text = record.get("message") or record.get("query") or record.get("title")
+                else:
+                    text = str(record)
+                if text:
+                    queries.append(text)
+    return queries or DEFAULT_QUERIES
+
+
+def synthetic_chunks(size: int, queries: list) -> list:
+    """Chunks drawn from the queries' vocabulary, so replayed queries find context."""
+    rng = np.random.default_rng(0)
+    words = sorted({word for query in queries for word in query.split()})
+    features = ["button", "form", "table", "header", "general"]
+    return [{
+        "content": " ".join(rng.choice(words, size=40)),
+        "metadata": {"header": f"Module {i % 20}", "section": f"Section {i % 100}",
+                     "feature": features[i % len(features)], "title": f"Chunk {i}"},
+    } for i in range(size)]
+
+
+class StageTimer:
+    """Wraps instance methods to record their wall time per stage, in ms."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def _record(self, stage: str, started: float):
+        with self.lock:
+            self.samples[stage].append((time.perf_counter() - started) * 1000)
+
+    def wrap_sync(self, obj, name: str, stage: str):
+        func = getattr(obj, name)
+
+        @wraps(func)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._record(stage, started)
+        setattr(obj, name, timed)
+
+    def wrap_async(self, obj, name: str, stage: str):
+        func = getattr(obj, name)
+
+        @wraps(func)
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self._record(stage, started)
+        setattr(obj, name, timed)
+
+    def wrap_async_gen(self, obj, name: str, stage: str):
+        func = getattr(obj, name)
+
+        @wraps(func)
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                async for item in func(*args, **kwargs):
+                    yield item
+            finally:
+                self._record(stage, started)
+        setattr(obj, name, timed)
+
+
+def setup_app(args, timer: StageTimer, queries: list):
+    """Import the app module and inject fakes in place of the startup event."""
+    module = importlib.import_module(args.app)
+    embedding_model = FakeEmbeddingModel(args.dim, args.embed_batch_ms, args.embed_item_ms)
+    rag_system = RAG(embedding_model)
+    llm = GeminiLLM(model=FakeLLMBackend(args.llm_first_token_ms, args.llm_token_ms, args.llm_tokens))
+
+    if all(os.path.exists(path) for path in source_paths()) and source_paths():
+        chunks = list(iter_corpus())
+    else:
+        chunks = synthetic_chunks(args.corpus_size, queries)
+    matrix = embedding_model.encode_batch([chunk_embedding_text(chunk) for chunk in chunks])
+    sample_chunks = [{"text": chunk["content"], "metadata": chunk["metadata"]} for chunk in chunks]
+    rag_system.build_index(sample_chunks, matrix)
+
+    timer.wrap_async(rag_system, "encode_query", "encode")
+    timer.wrap_async(rag_system, "retrieve", "retrieve")
+    timer.wrap_sync(llm, "build_prompt", "prompt_build")
+    timer.wrap_async(llm, "_generate_async", "generate")
+    timer.wrap_async_gen(llm, "_stream_async", "generate_stream")
+
+    # Both apps serve from the state in chat_pipeline
+    pipeline = importlib.import_module("chat_pipeline")
+    pipeline.embedding_model = embedding_model
+    pipeline.rag_system = rag_system
+    pipeline.llm = llm
+    pipeline.sample_chunks = sample_chunks
+    if not args.answer_cache:
+        pipeline.answer_cache.threshold = float("inf")
+    if not args.admission:
+        # Measure capacity, not the limits in front of it
+        pipeline.admission = AdmissionController(max_concurrent=10**6, rate=0, session_rate=0)
+    # Fakes are already in place; the real warm-up would load models
+    module.app.router.on_startup.clear()
+    pipeline.startup_state.finish()
+    print(f"{args.app}: {len(sample_chunks)} chunks, dim={args.dim}")
+    return module
+
+
+async def run_http(module, queries: list, total: int, concurrency: int):
+    transport = httpx.ASGITransport(app=module.app)
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        async def one(i: int):
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post("/chat", json={"message": queries[i % len(queries)]})
+                latencies.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, total / elapsed
+
+
+def run_websocket(module, queries: list, sessions: int, messages: int):
+    latencies, ttfts, errors = [], [], 0
+    lock = threading.Lock()
+
+    def session(client: TestClient, index: int):
+        nonlocal errors
+        with client.websocket_connect(f"/v1/chat/bench-{index}") as websocket:
+            for i in range(messages):
+                started = time.perf_counter()
+                first = None
+                websocket.send_text(json.dumps({"message": queries[(index * messages + i) % len(queries)]}))
+                while True:
+                    frame = websocket.receive_json()
+                    if "delta" in frame and first is None:
+                        first = time.perf_counter()
+                    if "error" in frame or frame.get("status") == "completed":
+                        break
+                with lock:
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    if first is not None:
+                        ttfts.append((first - started) * 1000)
+                    if "error" in frame:
+                        errors += 1
+
+    with TestClient(module.app) as client:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=sessions) as pool:
+            list(pool.map(lambda i: session(client, i), range(sessions)))
+        elapsed = time.perf_counter() - started
+    return latencies, ttfts, errors, sessions * messages / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", choices=["app", "app_2"], default="app_2")
+    parser.add_argument("--queries", default=os.path.join(REPO_ROOT, "requests.jsonl"))
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--ws-sessions", type=int, default=8)
+    parser.add_argument("--ws-messages", type=int, default=5)
+    parser.add_argument("--corpus-size", type=int, default=2000, help="synthetic chunks when the data files are missing")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--embed-batch-ms", type=float, default=5.0)
+    parser.add_argument("--embed-item-ms", type=float, default=1.0)
+    parser.add_argument("--llm-first-token-ms", type=float, default=300.0)
+    parser.add_argument("--llm-token-ms", type=float, default=5.0)
+    parser.add_argument("--llm-tokens", type=int, default=60)
+    parser.add_argument("--answer-cache", action="store_true", help="leave the semantic answer cache on")
+    parser.add_argument("--admission", action="store_true", help="leave admission control (rate limits, load shedding) on")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    timer = StageTimer()
+    queries = load_queries(args.queries)
+    module = setup_app(args, timer, queries)
+
+    results = {}
+    latencies, errors, rps = asyncio.run(run_http(module, queries, args.requests, args.concurrency))
+    results["http_chat"] = summarize(latencies)
+    print(f"\nPOST /chat: {args.requests} requests, concurrency {args.concurrency}, {rps:.1f} req/s, {errors} errors")
+
+    if args.app == "app_2" and args.ws_sessions > 0:
+        latencies, ttfts, errors, rps = run_websocket(module, queries, args.ws_sessions, args.ws_messages)
+        results["ws_chat"] = summarize(latencies)
+        results["ws_ttft"] = summarize(ttfts)
+        print(f"WS /v1/chat: {args.ws_sessions} sessions x {args.ws_messages} messages, {rps:.1f} msg/s, {errors} errors")
+
+    print_table("End-to-end latency", results)
+    stages = {f"stage/{name}": summarize(samples) for name, samples in timer.samples.items()}
+    print_table("Per-stage latency", stages)
+    results.update(stages)
+
+    section = f"load/{args.app}"
+    if args.save_baseline:
+        save_baseline(section, results)
+        print(f"\nBaseline saved for {section}")
+    if args.check_baseline:
+        regressions = compare_baseline(section, results, args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            sys.exit(1)
+        print(f"\nNo p95 regression beyond {args.tolerance:.0%} for {section}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Memory-vs-recall report for compact index storage against the float32 path.
+
+Usage:
+    python -m benchmarks.quantization --size 100000 --dim 384 --rescore 0 50
+"""
+import argparse
+import sys
+import time
+import numpy as np
+from benchmarks.ann_recall import synthetic_corpus
+from model.RAG import VectorIndex
+
+
+def python_list_bytes(corpus: np.ndarray, sample: int = 100) -> float:
+    """Estimated bytes for embeddings kept as Python lists of floats, one per chunk."""
+    rows = [row.tolist() for row in corpus[:sample]]
+    per_row = np.mean([sys.getsizeof(row) + sum(sys.getsizeof(x) for x in row) for row in rows])
+    return per_row * len(corpus)
+
+
+def timed_search(index: VectorIndex, queries: np.ndarray, top_k: int):
+    started = time.perf_counter()
+    results = [index.search_rows_batch(query[None, :], top_k)[0][0] for query in queries]
+    elapsed_ms = (time.perf_counter() - started) * 1000 / len(queries)
+    return [set(rows.tolist()) for rows in results], elapsed_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--rescore", type=int, nargs="+", default=[0, 50], help="re-scoring candidates; 0 disables")
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(args.size, args.dim, clusters=max(8, args.size // 500))
+    chunks = [{'id': i} for i in range(args.size)]
+    rng = np.random.default_rng(1)
+    queries = corpus[rng.choice(args.size, size=args.queries)] + 0.3 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+
+    exact = VectorIndex(dtype="float32").build_from_matrix(chunks, corpus.copy())
+    truth, exact_ms = timed_search(exact, queries, args.top_k)
+    lists_mb = python_list_bytes(corpus) / 2**20
+
+    print(f"corpus={args.size} dim={args.dim} queries={args.queries} top_k={args.top_k}")
+    print(f"{'storage':<18}{'MB':>10}{'vs lists':>10}{'recall@k':>10}{'ms/query':>12}")
+    print(f"{'python lists':<18}{lists_mb:>10.1f}{1.0:>10.2f}{1.0:>10.3f}{'-':>12}")
+    print(f"{'float32':<18}{exact.nbytes / 2**20:>10.1f}{exact.nbytes / 2**20 / lists_mb:>10.2f}{1.0:>10.3f}{exact_ms:>12.3f}")
+    for dtype in ("int8",):
+        for rescore in args.rescore:
+            index = VectorIndex(dtype=dtype, rescore_candidates=rescore).build_from_matrix(chunks, corpus.copy())
+            found, ms = timed_search(index, queries, args.top_k)
+            recall = np.mean([len(f & t) / len(t) for f, t in zip(found, truth)])
+            name = dtype + (f"+rescore{rescore}" if rescore else "")
+            mb = index.nbytes / 2**20
+            print(f"{name:<18}{mb:>10.1f}{mb / lists_mb:>10.2f}{recall:>10.3f}{ms:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Micro-benchmark of RAG.retrieve across corpus sizes.
+
+Uses random embeddings and a precomputed query embedding, so only index
+scoring (plus BM25 with --hybrid) is timed.
+
+Usage:
+    python -m benchmarks.retrieval --sizes 1000 10000 100000 1000000 --dim 384
+    python -m benchmarks.retrieval --index ivf --check-baseline
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import numpy as np
+
+from benchmarks.common import compare_baseline, print_table, save_baseline, summarize
+from benchmarks.fakes import FakeEmbeddingModel
+from model.RAG import RAG
+
+
+async def time_retrieve(rag: RAG, queries: np.ndarray, texts: list, top_k: int) -> list:
+    samples = []
+    for query, text in zip(queries, texts):
+        started = time.perf_counter()
+        await rag.retrieve(text, query_embedding=query, top_k=top_k)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--index", choices=["exact", "ivf"], default="exact")
+    parser.add_argument("--hybrid", action="store_true", help="also build and score BM25")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    os.environ["RETRIEVAL_INDEX"] = args.index
+    rng = np.random.default_rng(0)
+    words = np.array([f"w{i}" for i in range(5000)])
+    results = {}
+    for size in args.sizes:
+        rag = RAG(FakeEmbeddingModel(args.dim))
+        if not args.hybrid:
+            rag.hybrid_alpha = 0.0
+        matrix = rng.standard_normal((size, args.dim), dtype=np.float32)
+        if args.hybrid:
+            chunks = [{"text": " ".join(rng.choice(words, size=30))} for _ in range(size)]
+        else:
+            chunks = [{"text": f"chunk {i}"} for i in range(size)]
+        started = time.perf_counter()
+        rag.build_index(chunks, matrix)
+        build_s = time.perf_counter() - started
+        del matrix
+
+        queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+        texts = [" ".join(rng.choice(words, size=6)) for _ in range(args.queries)]
+        samples = asyncio.run(time_retrieve(rag, queries, texts, args.top_k))
+        results[f"{args.index}{'+bm25' if args.hybrid else ''}/{size}"] = summarize(samples)
+        print(f"size={size} build={build_s:.2f}s")
+
+    print_table(f"RAG.retrieve (dim={args.dim}, top_k={args.top_k})", results)
+
+    if args.save_baseline:
+        save_baseline("retrieval", results)
+        print("\nBaseline saved for retrieval")
+    if args.check_baseline:
+        regressions = compare_baseline("retrieval", results, args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            sys.exit(1)
+        print(f"\nNo p95 regression beyond {args.tolerance:.0%} for retrieval")
+
+
+if __name__ == "__main__":
+    main()
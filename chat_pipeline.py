@@ -0,0 +1,585 @@
+import os
+import hmac
+import json
+import time
+import asyncio
+import traceback
+from dotenv import load_dotenv
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, field_validator
+from typing import Dict, List, Optional, Union
+from uuid import uuid4
+from model.RAG import RAG, MetadataColumns
+from model.Embedding import get_embedding_model
+from model.LLM import GeminiLLM, is_error_response
+from model.AnswerCache import SemanticCache, chunk_set_key
+from model.ConversationStore import create_conversation_store
+from model.Metrics import REGISTRY, CACHE_LOOKUPS, TTFT_SECONDS, RequestTrace, Tracer
+from model.Reranker import create_reranker
+from model.Startup import StartupState
+from model.SharedIndex import create_shared_index_store
+from model.SingleFlight import SingleFlight, history_key, normalize_query
+from model.FAQ import FAQIndex, FAQMatch
+from model.Admission import AdmissionController, AdmissionRejected, ClientGone
+from data.preprocessing import build_corpus, corpus_fingerprint, embed_chunks, iter_corpus, source_paths
+
+load_dotenv()
+
+# Chat pipeline and state shared by app.py (HTTP) and app_2.py (HTTP + WebSocket).
+# Both apps mount `router` and call start_warm_up() on startup.
+router = APIRouter()
+
+rag_system = None
+embedding_model = None
+llm = None
+
+conversation_store = create_conversation_store()
+answer_cache = SemanticCache()
+# Stored FAQ answers returned without calling the LLM
+faq_index = FAQIndex()
+reload_lock = asyncio.Lock()
+# Set SHARED_INDEX_DIR to let workers share one memory-mapped index
+shared_index = create_shared_index_store()
+
+# Bounds the requests doing work at once; the rest queue or are shed early
+admission = AdmissionController()
+
+# Identical concurrent questions share one embedding/retrieval and one LLM call
+encode_flight = SingleFlight("encode")
+retrieval_flight = SingleFlight("retrieve")
+answer_flight = SingleFlight("answer")
+stream_flight = SingleFlight("stream")
+
+tracer = Tracer()
+REGISTRY.gauge("chatbot_admission_running", "Requests holding an admission slot", lambda: admission.running)
+REGISTRY.gauge("chatbot_admission_queued", "Requests waiting for an admission slot", lambda: admission.queued)
+REGISTRY.gauge("chatbot_conversation_sessions", "Sessions held by the conversation store", lambda: len(conversation_store))
+REGISTRY.gauge("chatbot_answer_cache_entries", "Entries in the semantic answer cache", lambda: answer_cache.stats()["size"])
+REGISTRY.gauge("chatbot_knowledge_base_chunks", "Chunks in the current index", lambda: len(sample_chunks))
+
+
+def validate_filters(filters):
+    """Reject filters on keys the index has no column for, so they fail as client errors."""
+    if filters is None:
+        return None
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be an object")
+    unknown = sorted(set(filters) - set(MetadataColumns.KEYS))
+    if unknown:
+        raise ValueError(f"Unknown metadata filter: {', '.join(unknown)} (allowed: {', '.join(MetadataColumns.KEYS)})")
+    return filters
+
+
+class ChatMessage(BaseModel):
+    role: str
+    content: str
+
+class ChatRequest(BaseModel):
+    message: str
+    session_id: Optional[str] = None
+    # Optional metadata filter, e.g. {"feature": "form"} or {"feature": ["form", "button"]}
+    filters: Optional[Dict[str, Union[str, List[str]]]] = None
+
+    @field_validator("filters")
+    @classmethod
+    def check_filters(cls, filters):
+        return validate_filters(filters)
+
+class ChatResponse(BaseModel):
+    response: str
+    session_id: str
+    # "faq" when a stored FAQ answer was returned directly, "llm" otherwise
+    answered_by: str = "llm"
+    # sources: Optional[List[dict]] = []
+    # user_role: str # admin, superadmin or household user
+
+class HealthResponse(BaseModel):
+    status: str
+    message: str
+
+sample_chunks = []
+startup_state = StartupState()
+warm_up_task = None
+REGISTRY.gauge("chatbot_ready", "1 once warm-up has finished", lambda: startup_state.ready)
+
+
+def start_warm_up():
+    """Start warm-up in the background and return at once, so the port is bound while models load."""
+    global warm_up_task
+    warm_up_task = asyncio.create_task(warm_up())
+
+
+async def warm_up():
+    """Load the models and build the index, publishing them together once ready."""
+    global rag_system, embedding_model, llm, sample_chunks, faq_index
+    try:
+        startup_state.enter("loading_embedding_model")
+        model = await asyncio.to_thread(get_embedding_model)
+        
+        startup_state.enter("loading_reranker")
+        reranker = await asyncio.to_thread(create_reranker)
+        rag = RAG(model, reranker)
+        
+        startup_state.enter("loading_llm")
+        gemini = await asyncio.to_thread(GeminiLLM)
+        
+        startup_state.enter("building_index")
+        # Taken before the sources are read, so edits made during the build trigger a reload
+        mtimes = source_mtimes()
+        if shared_index is None:
+            chunks, matrix = await build_corpus(model)
+            await asyncio.to_thread(rag.build_index, chunks, matrix)
+        else:
+            # The first worker builds and publishes; the others attach to its segment.
+            # A generation built from another model or older sources is rebuilt.
+            rag.index = await asyncio.to_thread(
+                shared_index.attach_or_build,
+                lambda: rag.prepare_index(*embed_chunks(iter_corpus(), model)),
+                await asyncio.to_thread(corpus_fingerprint, model)
+            )
+            chunks = rag.index.chunks
+        faq = await asyncio.to_thread(FAQIndex().build, chunks, model)
+        
+        embedding_model, rag_system, llm, sample_chunks, faq_index = model, rag, gemini, chunks, faq
+        startup_state.finish()
+        print(f"Loaded {len(sample_chunks)} chunks")
+        
+        watch_interval = float(os.getenv("KB_WATCH_INTERVAL", "0"))
+        if watch_interval > 0:
+            asyncio.create_task(watch_knowledge_base(watch_interval, mtimes))
+        if shared_index is not None:
+            asyncio.create_task(follow_shared_index(float(os.getenv("SHARED_INDEX_POLL_INTERVAL", "2"))))
+        print("Server started successfully")
+    except Exception as e:
+        startup_state.fail(e)
+        print(f"Initialization error: {e}")
+        traceback.print_exc()
+
+
+async def admit_request(request: ChatRequest, http_request: Request) -> float:
+    """
+    Take an admission slot for an HTTP chat request.
+
+    :return: Start time to hand back to admission.release()
+    :raises HTTPException: 429 or 503 with Retry-After when the request is shed
+    """
+    # A request without a session_id starts a new session, so only the global limit applies
+    try:
+        return await admission.acquire(request.session_id, http_request.is_disconnected)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+    except ClientGone:
+        raise HTTPException(status_code=499, detail="Client closed request")
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """StreamingResponse that frees its admission slot however the stream ends, even if it never starts."""
+
+    def __init__(self, content, admitted: float, **kwargs):
+        super().__init__(content, **kwargs)
+        self.admitted = admitted
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            admission.release(self.admitted)
+
+
+def require_ready():
+    """Fail fast with 503 and Retry-After until warm-up has finished."""
+    if not startup_state.ready:
+        detail = "Server failed to start" if startup_state.phase == "failed" else "Server is starting, please try again later"
+        raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": str(startup_state.retry_after)})
+
+
+async def reload_knowledge_base() -> int:
+    """
+    Re-parse the sources and swap in a freshly built index.
+
+    The new index is built off the event loop and published with a single
+    assignment, so in-flight retrievals keep using the index they started with.
+    """
+    global sample_chunks, faq_index
+    async with reload_lock:
+        if shared_index is None:
+            chunks, matrix = await build_corpus(embedding_model)
+            await asyncio.to_thread(rag_system.build_index, chunks, matrix)
+        else:
+            # Skips the rebuild when another worker already replaced our generation
+            rag_system.index = await asyncio.to_thread(
+                shared_index.refresh,
+                lambda: rag_system.prepare_index(*embed_chunks(iter_corpus(), embedding_model)),
+                rag_system.index.generation,
+                await asyncio.to_thread(corpus_fingerprint, embedding_model)
+            )
+            chunks = rag_system.index.chunks
+        sample_chunks = chunks
+        faq_index = await asyncio.to_thread(FAQIndex().build, chunks, embedding_model)
+        answer_cache.clear()
+    print(f"Knowledge base reloaded: {len(chunks)} chunks")
+    return len(chunks)
+
+
+async def follow_shared_index(interval: float):
+    """Attach to generations published by other workers or by python -m model.SharedIndex."""
+    global sample_chunks, faq_index
+    ignored = None
+    while True:
+        await asyncio.sleep(interval)
+        generation = shared_index.current_generation()
+        if generation is None or generation in (rag_system.index.generation, ignored):
+            continue
+        # Vectors from another embedding model cannot be searched with ours
+        published = shared_index.fingerprint(generation) or {}
+        expected = await asyncio.to_thread(corpus_fingerprint, embedding_model)
+        if (published.get("model"), published.get("dim")) != (expected["model"], expected["dim"]):
+            print(f"Shared index generation {generation} was built with another embedding model, ignoring it")
+            ignored = generation
+            continue
+        try:
+            async with reload_lock:
+                rag_system.index = await asyncio.to_thread(shared_index.attach, generation)
+                sample_chunks = rag_system.index.chunks
+                faq_index = await asyncio.to_thread(FAQIndex().build, sample_chunks, embedding_model)
+                answer_cache.clear()
+            print(f"Attached shared index generation {generation}")
+        except Exception as e:
+            print(f"Shared index attach failed: {e}")
+
+
+def source_mtimes() -> tuple:
+    return tuple(os.path.getmtime(path) if os.path.exists(path) else None for path in source_paths())
+
+
+async def watch_knowledge_base(interval: float, mtimes: Optional[tuple] = None):
+    """
+    Poll the source files and reload when one of them changes.
+
+    :param mtimes: source_mtimes() when the current index was built; defaults to now
+    """
+    mtimes = mtimes if mtimes is not None else source_mtimes()
+    while True:
+        await asyncio.sleep(interval)
+        current = source_mtimes()
+        if current != mtimes:
+            mtimes = current
+            try:
+                await reload_knowledge_base()
+            except Exception as e:
+                print(f"Knowledge base reload failed: {e}")
+
+
+async def load_history(session_id: str, message: str) -> list:
+    """
+    The session's stored turns followed by the new user message.
+
+    Nothing is written here: save_turn stores the message together with its
+    answer once the request has completed, so a cancelled or failed request
+    leaves no unanswered turn behind and concurrent requests on one session
+    do not interleave their turns.
+    """
+    history = await conversation_store.get_history_async(session_id)
+    history.append({"role": "user", "content": message})
+    return history[-conversation_store.max_messages:]
+
+
+async def save_turn(session_id: str, message: str, response_text: str):
+    await conversation_store.extend_async(session_id, [
+        {"role": "user", "content": message},
+        {"role": "assistant", "content": response_text},
+    ])
+
+
+async def match_faq(message: str, trace: RequestTrace, filters: Optional[dict] = None):
+    """
+    FAQ fast path: look the message up among the stored questions before retrieval.
+
+    Filtered requests always take the retrieval path.
+
+    :return: (FAQMatch or None, query embedding computed for the lookup or None)
+    """
+    if filters or not (rag_system and len(faq_index)):
+        return None, None
+    with trace.stage("faq"):
+        match = faq_index.match_text(message)
+    if match is not None:
+        return match, None
+    with trace.stage("encode"):
+        query_embedding = await encode_flight.run(
+            normalize_query(message),
+            lambda: rag_system.encode_query(message, embedding_model)
+        )
+    with trace.stage("faq"):
+        match = faq_index.match(query_embedding)
+    return match, query_embedding
+
+
+async def faq_stream(match: FAQMatch):
+    yield match.answer
+
+
+async def retrieve_chunks(message: str, trace: RequestTrace, filters: Optional[dict] = None, query_embedding=None):
+    """Return (relevant_chunks, query_embedding) for a user message."""
+    if not (rag_system and sample_chunks):
+        return [], None
+    key = (normalize_query(message), json.dumps(filters, sort_keys=True) if filters else None)
+    return await retrieval_flight.run(key, lambda: search_chunks(message, trace, filters, query_embedding))
+
+
+async def search_chunks(message: str, trace: RequestTrace, filters: Optional[dict] = None, query_embedding=None):
+    if query_embedding is None:
+        with trace.stage("encode"):
+            query_embedding = await rag_system.encode_query(message, embedding_model)
+    # No chunk list is passed so retrieval uses whatever index is current
+    with trace.stage("retrieve"):
+        relevant_chunks = await rag_system.retrieve(
+            data=message,
+            top_k=5,
+            query_embedding=query_embedding,
+            filters=filters
+        )
+    return relevant_chunks, query_embedding
+
+
+def use_answer_cache(history: list, query_embedding) -> bool:
+    # Follow-ups depend on earlier turns, so only a session's first question is cached
+    return query_embedding is not None and len(history) == 1
+
+
+def lookup_answer_cache(relevant_chunks: list, query_embedding) -> Optional[str]:
+    cached = answer_cache.get(query_embedding, relevant_chunks)
+    CACHE_LOOKUPS.inc("miss" if cached is None else "hit")
+    return cached
+
+
+def answer_key(message: str, relevant_chunks: list, history: list) -> tuple:
+    # Same question, same earlier turns and same context chunks give the same prompt
+    return normalize_query(message), history_key(history), chunk_set_key(relevant_chunks)
+
+
+async def generate_answer(message: str, relevant_chunks: list, history: list, query_embedding, trace: RequestTrace) -> str:
+    return await answer_flight.run(
+        answer_key(message, relevant_chunks, history),
+        lambda: produce_answer(message, relevant_chunks, history, query_embedding, trace)
+    )
+
+
+async def produce_answer(message: str, relevant_chunks: list, history: list, query_embedding, trace: RequestTrace) -> str:
+    use_cache = use_answer_cache(history, query_embedding)
+    if use_cache:
+        cached = lookup_answer_cache(relevant_chunks, query_embedding)
+        if cached is not None:
+            return cached
+    with trace.stage("generate"):
+        response_text = await llm.generate_response_async(
+            query=message,
+            rag_results=relevant_chunks,
+            conversation_history=history
+        )
+    if use_cache and not is_error_response(response_text):
+        answer_cache.put(query_embedding, relevant_chunks, response_text)
+    return response_text
+
+
+async def stream_answer(message: str, relevant_chunks: list, history: list, query_embedding, trace: RequestTrace):
+    """Streaming variant of generate_answer yielding text deltas."""
+    async for delta in stream_flight.stream(
+        answer_key(message, relevant_chunks, history),
+        lambda: produce_answer_stream(message, relevant_chunks, history, query_embedding, trace)
+    ):
+        yield delta
+
+
+async def produce_answer_stream(message: str, relevant_chunks: list, history: list, query_embedding, trace: RequestTrace):
+    use_cache = use_answer_cache(history, query_embedding)
+    if use_cache:
+        cached = lookup_answer_cache(relevant_chunks, query_embedding)
+        if cached is not None:
+            yield cached
+            return
+    parts = []
+    # Includes the time spent handing deltas to the client
+    with trace.stage("generate"):
+        async for delta in llm.stream_response_async(
+            query=message,
+            rag_results=relevant_chunks,
+            conversation_history=history
+        ):
+            parts.append(delta)
+            yield delta
+    response_text = "".join(parts)
+    if use_cache and not is_error_response(response_text):
+        answer_cache.put(query_embedding, relevant_chunks, response_text)
+
+
+@router.get("/", response_model=HealthResponse)
+async def root():
+    return HealthResponse(
+        status="ok",
+        message="Chatbot API is working properly"
+    )
+
+
+@router.get("/health", response_model=HealthResponse)
+async def health_check():
+    return HealthResponse(
+        status="healthy",
+        message="Server is running normally"
+    )
+
+
+@router.get("/ready")
+async def ready():
+    """Readiness check: 200 once models and index are loaded, else 503 with the warm-up phase."""
+    status = startup_state.status()
+    if not startup_state.ready:
+        return JSONResponse(status, status_code=503, headers={"Retry-After": str(startup_state.retry_after)})
+    status["chunks"] = len(sample_chunks)
+    return status
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of latency histograms, counters and gauges."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.post("/admin/reload")
+async def admin_reload(x_admin_token: Optional[str] = Header(default=None)):
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), admin_token.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+    
+    require_ready()
+    
+    try:
+        count = await reload_knowledge_base()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Reload error: {str(e)}")
+    return {"status": "reloaded", "chunks": count}
+
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat(request: ChatRequest, http_request: Request):
+    global rag_system, sample_chunks, conversation_store, llm
+    
+    if not request.message.strip():
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    
+    require_ready()
+    admitted = await admit_request(request, http_request)
+    
+    try:
+        with tracer.request("chat") as trace:
+            # Get or create session
+            session_id = request.session_id or str(uuid4())
+            
+            # Load the stored history followed by the new message
+            with trace.stage("history"):
+                history = await load_history(session_id, request.message)
+            
+            # Answer stored FAQ questions directly
+            faq_match, query_embedding = await match_faq(request.message, trace, request.filters)
+            if faq_match is not None:
+                response_text = faq_match.answer
+            else:
+                # Retrieve relevant chunks
+                relevant_chunks, query_embedding = await retrieve_chunks(request.message, trace, request.filters, query_embedding)
+                
+                # Nobody is left to read the answer
+                await admission.ensure_connected(http_request.is_disconnected)
+                
+                # Generate response using LLM with history
+                response_text = await generate_answer(request.message, relevant_chunks, history, query_embedding, trace)
+            
+            await save_turn(session_id, request.message, response_text)
+            
+            # sources = []
+            # for chunk, score in relevant_chunks[:3]:
+            #     sources.append({
+            #         "text": chunk.get('text', chunk.get('content', ''))[:200],
+            #         "score": round(score, 4)
+            #     })
+            
+            return ChatResponse(
+                response=response_text,
+                session_id=session_id,
+                answered_by="faq" if faq_match else "llm",
+                # sources=sources
+            )
+    
+    except ClientGone:
+        raise HTTPException(status_code=499, detail="Client closed request")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
+    finally:
+        admission.release(admitted)
+
+
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request):
+    """Server-Sent-Events variant of /chat that streams response deltas."""
+    global rag_system, sample_chunks, conversation_store, llm
+    
+    if not request.message.strip():
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    
+    require_ready()
+    admitted = await admit_request(request, http_request)
+    
+    session_id = request.session_id or str(uuid4())
+    
+    # The trace is finished by event_stream, after the last frame is sent
+    trace = tracer.start("chat_stream")
+    try:
+        with trace.stage("history"):
+            history = await load_history(session_id, request.message)
+        
+        faq_match, query_embedding = await match_faq(request.message, trace, request.filters)
+        if faq_match is None:
+            relevant_chunks, query_embedding = await retrieve_chunks(request.message, trace, request.filters, query_embedding)
+    except Exception:
+        tracer.finish(trace, "error")
+        admission.release(admitted)
+        raise
+    
+    async def event_stream():
+        started = time.perf_counter()
+        ttft_ms = None
+        parts = []
+        status = "error"
+        if faq_match is not None:
+            deltas = faq_stream(faq_match)
+        else:
+            deltas = stream_answer(request.message, relevant_chunks, history, query_embedding, trace)
+        try:
+            async for delta in deltas:
+                if ttft_ms is None:
+                    ttft_ms = round((time.perf_counter() - started) * 1000, 1)
+                    TTFT_SECONDS.observe(ttft_ms / 1000, "chat_stream")
+                parts.append(delta)
+                yield f"data: {json.dumps({'delta': delta}, ensure_ascii=False)}\n\n"
+            
+            response_text = "".join(parts)
+            await save_turn(session_id, request.message, response_text)
+            
+            done = {
+                "response": response_text,
+                "session_id": session_id,
+                "ttft_ms": ttft_ms,
+                "answered_by": "faq" if faq_match else "llm"
+            }
+            yield f"event: done\ndata: {json.dumps(done, ensure_ascii=False)}\n\n"
+            status = "ok"
+        except (asyncio.CancelledError, GeneratorExit):
+            status = "cancelled"
+            raise
+        finally:
+            tracer.finish(trace, status)
+    
+    return AdmittedStreamingResponse(event_stream(), admitted, media_type="text/event-stream")
@@ -1,6 +1,11 @@
 import re
-from typing import List, Dict
+import asyncio
+import hashlib
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Tuple
+import numpy as np
 from model.Embedding import EmbeddingModel
+from model.EmbeddingStore import EmbeddingStore
 import os
 from dotenv import load_dotenv
 load_dotenv()
@@ -12,6 +17,9 @@ FEATURE_KEYWORDS = {
     "header": ["Header", "Tiêu Đề"],
 }
 
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "512"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "64"))
+
 def detect_feature(title: str) -> str:
     for feature, keywords in FEATURE_KEYWORDS.items():
         for kw in keywords:
@@ -20,10 +28,7 @@ def detect_feature(title: str) -> str:
     return "general"
 
 
-def load_system_data_chunks(md_text: str) -> List[Dict]:
-    lines = md_text.splitlines()
-
-    chunks = []
+def iter_system_data_chunks(lines: Iterable[str]) -> Iterator[Dict]:
     current_chunk = []
     metadata = {
         "header": None,
@@ -33,15 +38,17 @@ def load_system_data_chunks(md_text: str) -> List[Dict]:
     }
     def flush_chunk():
         if current_chunk:
-            chunks.append({
+            return {
                 "content": "\n".join(current_chunk).strip(),
                 "metadata": metadata.copy()
-            })
+            }
 
     for line in lines:
         # ## header / Module
         if line.startswith("## "):
-            flush_chunk()
+            chunk = flush_chunk()
+            if chunk:
+                yield chunk
             current_chunk = [ line.replace("##", "").strip("\n") ]
             metadata["header"] = line.replace("##", "").strip()
             metadata["section"] = None
@@ -50,7 +57,9 @@ def load_system_data_chunks(md_text: str) -> List[Dict]:
 
         # ### Section
         elif line.startswith("### "):
-            flush_chunk()
+            chunk = flush_chunk()
+            if chunk:
+                yield chunk
             current_chunk = [line.replace("###", "").strip("\n")]
             metadata["section"] = line.replace("###", "").strip()
             metadata["feature"] = "section"
@@ -58,7 +67,9 @@ def load_system_data_chunks(md_text: str) -> List[Dict]:
 
         # #### Feature OR bold feature title
         elif line.startswith("#### ") :
-            flush_chunk()
+            chunk = flush_chunk()
+            if chunk:
+                yield chunk
             title = re.sub(r"[*#]", "", line).strip()
             current_chunk = [line.replace("####", "").strip("\n")]
             metadata["title"] = title
@@ -67,36 +78,46 @@ def load_system_data_chunks(md_text: str) -> List[Dict]:
         else:
             current_chunk.append(line)
 
-    flush_chunk()
-    return chunks
-def load_question_chunks(md_text: str) -> List[Dict]:
-    lines = md_text.splitlines()
+    chunk = flush_chunk()
+    if chunk:
+        yield chunk
+
 
-    chunks = []
+def load_system_data_chunks(md_text: str) -> List[Dict]:
+    return list(iter_system_data_chunks(md_text.splitlines()))
+
+
+def iter_question_chunks(lines: Iterable[str]) -> Iterator[Dict]:
     current_answer = []
     metadata = {
         "header": None,
         "title": None,
+        # Lets the FAQ fast path find question/answer chunks in the index
+        "source": "faq",
     }
     
     def flush_chunk():
         if current_answer and metadata["title"]:
-            chunks.append({
+            return {
                 "content": "\n".join(current_answer).strip(),
                 "metadata": metadata.copy()
-            })
+            }
     
     for line in lines:
         # ### Header section
         if line.startswith("### "):
-            flush_chunk()
+            chunk = flush_chunk()
+            if chunk:
+                yield chunk
             current_answer = []
             metadata["header"] = line.replace("###", "").strip()
             metadata["title"] = None
         
         # **Q: Question
         elif line.startswith("**Q:") or line.startswith("**Q "):
-            flush_chunk()
+            chunk = flush_chunk()
+            if chunk:
+                yield chunk
             current_answer = []
             # Extract question text: remove **Q: and trailing **
             question = re.sub(r"^\*\*Q[:\s]*", "", line)
@@ -113,17 +134,147 @@ def load_question_chunks(md_text: str) -> List[Dict]:
         elif line.strip() and metadata["title"]:
             current_answer.append(line)
     
-    flush_chunk()
-    return chunks
-        
-        
-async def load_chunk(embedding: EmbeddingModel):
-    with open(os.getenv("SYSTEM_DATA_PATH"), "r", encoding="utf-8") as f:
-        system_data = f.read()
-    with open(os.getenv("NORMAL_QUESTION_DATA_PATH"), "r", encoding="utf-8") as f:
-        question_data = f.read()
-    system_chunks = load_system_data_chunks(system_data)
-    question_chunks = load_question_chunks(question_data)
-    return system_chunks, question_chunks
+    chunk = flush_chunk()
+    if chunk:
+        yield chunk
+
+
+def load_question_chunks(md_text: str) -> List[Dict]:
+    return list(iter_question_chunks(md_text.splitlines()))
+
+
+def split_chunk(chunk: Dict, max_tokens: int = CHUNK_MAX_TOKENS, overlap: int = CHUNK_OVERLAP) -> Iterator[Dict]:
+    """
+    Split a chunk whose content exceeds max_tokens whitespace tokens into
+    overlapping windows. Original formatting is kept; continuation parts are
+    prefixed with the chunk title so each part stands on its own, and their
+    windows are shortened by the title's tokens so no part exceeds max_tokens.
+    A title too long to leave room past the overlap is not prefixed.
+    """
+    if overlap >= max_tokens:
+        raise ValueError(f"Chunk overlap ({overlap}) must be smaller than max_tokens ({max_tokens})")
+    spans = [m.span() for m in re.finditer(r"\S+", chunk["content"])]
+    if len(spans) <= max_tokens:
+        yield chunk
+        return
+    title = chunk["metadata"].get("title")
+    continuation = max_tokens - len(title.split()) if title else max_tokens
+    if continuation <= overlap:
+        title, continuation = None, max_tokens
+    start, size, part = 0, max_tokens, 0
+    while True:
+        window = spans[start:start + size]
+        content = chunk["content"][window[0][0]:window[-1][1]]
+        if part > 0 and title:
+            content = f"{title}\n{content}"
+        yield {"content": content, "metadata": {**chunk["metadata"], "part": part}}
+        if start + size >= len(spans):
+            return
+        start, size, part = start + size - overlap, continuation, part + 1
+
+
+def iter_lines(path: str) -> Iterator[str]:
+    """Stream lines from disk without reading the whole file."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            yield line.rstrip("\r\n")
+
+
+def expand_sources(spec: str) -> List[str]:
+    """
+    Resolve a data path setting: a file, a directory of .md files, or a
+    comma-separated list of either.
+    """
+    paths = []
+    for item in (part.strip() for part in (spec or "").split(",")):
+        if not item:
+            continue
+        if os.path.isdir(item):
+            paths.extend(sorted(
+                os.path.join(item, name) for name in os.listdir(item) if name.endswith(".md")
+            ))
+        else:
+            paths.append(item)
+    return paths
+
+
+def iter_chunks(paths: Iterable[str], parser) -> Iterator[Dict]:
+    for path in paths:
+        for chunk in parser(iter_lines(path)):
+            yield from split_chunk(chunk)
+
+
+def iter_corpus() -> Iterator[Dict]:
+    """Lazily yield every chunk of the system and question sources."""
+    yield from iter_chunks(expand_sources(os.getenv("SYSTEM_DATA_PATH")), iter_system_data_chunks)
+    yield from iter_chunks(expand_sources(os.getenv("NORMAL_QUESTION_DATA_PATH")), iter_question_chunks)
+
+
+def chunk_embedding_text(chunk: Dict) -> str:
+    metadata = chunk['metadata']
+    # Parts of a split chunk share header and title, so each is embedded with its own text
+    if metadata.get('part') is not None:
+        content = chunk['content']
+        if metadata['title'] and not content.startswith(metadata['title']):
+            content = f"{metadata['title']}\n{content}"
+        return f"{metadata['header']}\n{content}"
+    return str(metadata['header']) + str(metadata['title'])
+
+
+def embed_chunks(chunks: Iterable[Dict], embedding: EmbeddingModel, batch_size: int = 1024) -> Tuple[List[Dict], np.ndarray]:
+    """
+    Embed chunks, reusing the on-disk cache for unchanged ones.
+
+    chunks may be a lazy iterator; it is consumed batch_size chunks at a time.
+    Vectors are returned as one float32 matrix instead of per-chunk lists, so
+    the index can take it over without another copy.
+
+    :return: ([{'text', 'metadata'}], matrix with one row per chunk)
+    """
+    store = EmbeddingStore(embedding.model_name)
+    store.begin()
+    embedded, blocks = [], []
+    chunks = iter(chunks)
+    while True:
+        batch = list(islice(chunks, batch_size))
+        if not batch:
+            break
+        blocks.append(store.lookup([chunk_embedding_text(chunk) for chunk in batch], embedding.encode_batch))
+        embedded.extend({'text': chunk['content'], 'metadata': chunk['metadata']} for chunk in batch)
+    store.commit()
+    matrix = np.concatenate(blocks) if blocks else np.empty((0, 0), dtype=np.float32)
+    return embedded, matrix
+
+
+def source_paths() -> List[str]:
+    return expand_sources(os.getenv("SYSTEM_DATA_PATH")) + expand_sources(os.getenv("NORMAL_QUESTION_DATA_PATH"))
+
+
+def corpus_fingerprint(embedding: EmbeddingModel) -> Dict:
+    """
+    Identity of the index the current sources would produce: embedding model,
+    vector dimension, chunking settings and a hash of every source file's
+    path, size and modification time.
+    """
+    digest = hashlib.sha256()
+    for path in source_paths():
+        try:
+            stat = os.stat(path)
+            digest.update(f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+        except OSError:
+            digest.update(f"{path}\0missing\n".encode())
+    return {
+        "model": embedding.model_name,
+        "dim": int(embedding.encode_batch(["dimension probe"]).shape[1]),
+        "chunking": [CHUNK_MAX_TOKENS, CHUNK_OVERLAP],
+        "sources": digest.hexdigest(),
+    }
+
 
+async def build_corpus(embedding: EmbeddingModel) -> Tuple[List[Dict], np.ndarray]:
+    """
+    Stream, chunk and embed both sources off the event loop; only changed chunks are encoded.
 
+    :return: (chunks, embedding matrix) as taken by RAG.build_index
+    """
+    return await asyncio.to_thread(embed_chunks, iter_corpus(), embedding)
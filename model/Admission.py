@@ -0,0 +1,202 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Optional
+from dotenv import load_dotenv
+from .Metrics import REGISTRY
+
+load_dotenv()
+
+ADMISSIONS = REGISTRY.counter(
+    "chatbot_admission_total",
+    "Admission decisions by outcome (admitted, rate_limited, session_rate_limited, queue_full, overloaded, timeout, client_gone)",
+    ("outcome",)
+)
+
+
+class AdmissionRejected(Exception):
+    """A request turned away before doing any work; status_code is 429 or 503."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float, outcome: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = max(1, int(retry_after + 0.999))
+        self.outcome = outcome
+
+
+class ClientGone(Exception):
+    """The client disconnected while its request was queued or running."""
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take one token; return 0 on success, else seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """
+    Bounded admission for the chat endpoints.
+
+    At most max_concurrent requests hold a slot; up to max_queue more wait
+    for one in FIFO order, and anything beyond that is rejected at once.
+    A new request is also rejected when its predicted queue wait, from the
+    slot hold times of recent requests, exceeds the deadline: clients that
+    would time out anyway get a fast 503 instead of tying up the embedding
+    model and Gemini. Global and per-session token buckets answer 429.
+    Queued requests whose client has disconnected are dropped.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        deadline: Optional[float] = None,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        session_rate: Optional[float] = None,
+        session_burst: Optional[float] = None,
+        max_sessions: int = 10000,
+    ):
+        self.max_concurrent = max_concurrent or int(os.getenv("ADMISSION_MAX_CONCURRENT", "16"))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+        self.deadline = deadline or float(os.getenv("ADMISSION_DEADLINE", "30"))
+        rate = rate if rate is not None else float(os.getenv("ADMISSION_RATE", "0"))
+        burst = burst or float(os.getenv("ADMISSION_BURST", "0")) or max(1.0, rate)
+        self.session_rate = session_rate if session_rate is not None else float(os.getenv("ADMISSION_SESSION_RATE", "2"))
+        self.session_burst = session_burst or float(os.getenv("ADMISSION_SESSION_BURST", "5"))
+        # A rate of 0 disables that limit
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self.sessions: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.max_sessions = max_sessions
+
+        self.running = 0
+        self.waiters: deque = deque()
+        # EWMA of how long a request holds its slot; None until the first one finishes
+        self.service_time: Optional[float] = None
+        self.smoothing = 0.2
+        self.poll_interval = 0.25
+
+    @property
+    def queued(self) -> int:
+        return len(self.waiters)
+
+    def predicted_wait(self, position: Optional[int] = None) -> float:
+        """Seconds a request entering the queue at position (default: the back) is expected to wait."""
+        if self.service_time is None:
+            return 0.0
+        position = self.queued + 1 if position is None else position
+        return position * self.service_time / self.max_concurrent
+
+    def _check_rate(self, session_id: Optional[str]):
+        if self.bucket is not None:
+            wait = self.bucket.take()
+            if wait:
+                self._reject(429, "Too many requests", wait, "rate_limited")
+        if session_id and self.session_rate > 0:
+            bucket = self.sessions.get(session_id)
+            if bucket is None:
+                bucket = self.sessions[session_id] = TokenBucket(self.session_rate, self.session_burst)
+                if len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+            self.sessions.move_to_end(session_id)
+            wait = bucket.take()
+            if wait:
+                self._reject(429, "Too many requests for this session", wait, "session_rate_limited")
+
+    def _reject(self, status_code: int, detail: str, retry_after: float, outcome: str):
+        ADMISSIONS.inc(outcome)
+        raise AdmissionRejected(status_code, detail, retry_after, outcome)
+
+    async def acquire(self, session_id: Optional[str] = None, is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None) -> float:
+        """
+        Wait for a slot or fail fast.
+
+        :param session_id: Key for the per-session rate limit (session id or client address)
+        :param is_disconnected: Async callable polled while queued; True drops the request
+        :return: Start time to pass to release()
+        :raises AdmissionRejected: Rate limited (429), or queue full / predicted wait too long (503)
+        :raises ClientGone: The client disconnected while queued
+        """
+        self._check_rate(session_id)
+
+        if self.running < self.max_concurrent and not self.waiters:
+            self.running += 1
+            ADMISSIONS.inc("admitted")
+            return time.perf_counter()
+
+        if self.queued >= self.max_queue:
+            self._reject(503, "Server is overloaded, queue is full", self.predicted_wait(), "queue_full")
+        wait = self.predicted_wait()
+        if wait > self.deadline:
+            self._reject(503, "Server is overloaded", wait, "overloaded")
+
+        slot = asyncio.get_running_loop().create_future()
+        self.waiters.append(slot)
+        give_up = time.monotonic() + self.deadline
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(asyncio.shield(slot), self.poll_interval)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+                if is_disconnected is not None:
+                    await self.ensure_connected(is_disconnected)
+                if time.monotonic() > give_up:
+                    self._reject(503, "Timed out waiting for a free slot", self.predicted_wait(), "timeout")
+        except BaseException:
+            if slot.done() and not slot.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self._release_slot()
+            else:
+                slot.cancel()
+                self.waiters.remove(slot)
+            raise
+        ADMISSIONS.inc("admitted")
+        return time.perf_counter()
+
+    async def ensure_connected(self, is_disconnected: Callable[[], Awaitable[bool]]):
+        """Raise ClientGone once the client has disconnected, so no more work is spent on it."""
+        if await is_disconnected():
+            ADMISSIONS.inc("client_gone")
+            raise ClientGone()
+
+    def _release_slot(self):
+        while self.waiters:
+            slot = self.waiters.popleft()
+            if not slot.done():
+                # The slot moves to the waiter, so running stays unchanged
+                slot.set_result(None)
+                return
+        self.running -= 1
+
+    def release(self, started: float):
+        """Free the slot taken by acquire() and record how long it was held."""
+        held = time.perf_counter() - started
+        self.service_time = held if self.service_time is None else (1 - self.smoothing) * self.service_time + self.smoothing * held
+        self._release_slot()
+
+    @asynccontextmanager
+    async def admit(self, session_id: Optional[str] = None, is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None):
+        """Hold a slot for the duration of the block; see acquire()."""
+        started = await self.acquire(session_id, is_disconnected)
+        try:
+            yield
+        finally:
+            self.release(started)
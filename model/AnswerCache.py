@@ -0,0 +1,100 @@
+import os
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def chunk_set_key(rag_results: List[tuple]) -> frozenset:
+    return frozenset(chunk.get('text', chunk.get('content', '')) for chunk, _ in rag_results)
+
+
+class SemanticCache:
+    """
+    Answer cache keyed on the query embedding.
+
+    A lookup hits when a cached query has cosine similarity >= threshold with
+    the new one and the same retrieved chunk set. Entries are evicted LRU once
+    max_size is reached and expire after ttl seconds. Cached embeddings sit in
+    one preallocated matrix so a lookup is a single matrix-vector product.
+    """
+
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[float] = None, threshold: Optional[float] = None):
+        self.max_size = max_size or int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+        self.ttl = ttl if ttl is not None else float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+        self.threshold = threshold if threshold is not None else float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+        self.entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self.matrix: Optional[np.ndarray] = None
+        self.valid = np.zeros(self.max_size, dtype=bool)
+        self.free_slots = list(range(self.max_size - 1, -1, -1))
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _normalize(self, query_embedding) -> np.ndarray:
+        vector = np.asarray(query_embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _evict(self, slot: int):
+        del self.entries[slot]
+        self.valid[slot] = False
+        self.free_slots.append(slot)
+
+    def get(self, query_embedding, rag_results: List[tuple]) -> Optional[str]:
+        """
+        :param query_embedding: Embedding of the new query
+        :param rag_results: (chunk, score) list retrieved for it
+        :return: Cached answer, or None on a miss
+        """
+        if not self.entries:
+            self.misses += 1
+            return None
+
+        query = self._normalize(query_embedding)
+        scores = self.matrix @ query
+        scores[~self.valid] = -np.inf
+        candidates = np.flatnonzero(scores >= self.threshold)
+        key = chunk_set_key(rag_results)
+        now = time.monotonic()
+        for slot in candidates[np.argsort(-scores[candidates])]:
+            slot = int(slot)
+            entry_key, answer, expires_at = self.entries[slot]
+            if expires_at <= now:
+                self._evict(slot)
+                continue
+            if entry_key == key:
+                self.entries.move_to_end(slot)
+                self.hits += 1
+                return answer
+        self.misses += 1
+        return None
+
+    def put(self, query_embedding, rag_results: List[tuple], answer: str):
+        query = self._normalize(query_embedding)
+        if self.matrix is None:
+            self.matrix = np.zeros((self.max_size, query.shape[0]), dtype=np.float32)
+        if not self.free_slots:
+            self._evict(next(iter(self.entries)))
+        slot = self.free_slots.pop()
+        self.matrix[slot] = query
+        self.valid[slot] = True
+        self.entries[slot] = (chunk_set_key(rag_results), answer, time.monotonic() + self.ttl)
+
+    def clear(self):
+        for slot in list(self.entries):
+            self._evict(slot)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,95 @@
+import re
+import unicodedata
+import numpy as np
+from typing import List, Tuple
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and strip Vietnamese diacritics so 'Đăng ký' and 'dang ky' match."""
+    text = unicodedata.normalize("NFD", text.lower()).replace("đ", "d")
+    return "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(normalize_text(text))
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index with array-backed postings.
+
+    Postings of all terms live in two flat arrays (doc ids and precomputed
+    BM25 weights) sliced by per-term offsets, so scoring a query is a few
+    vectorized scatter-adds.
+    """
+
+    def __init__(self, documents: List[str] = None, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocabulary: dict = {}
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.doc_ids = np.empty(0, dtype=np.int32)
+        self.weights = np.empty(0, dtype=np.float32)
+        self.num_docs = 0
+        if documents is not None:
+            self.build(documents)
+
+    def __len__(self) -> int:
+        return self.num_docs
+
+    def build(self, documents: List[str]) -> "BM25Index":
+        term_ids, doc_ids, tfs = [], [], []
+        doc_lengths = np.zeros(len(documents), dtype=np.float32)
+        vocabulary: dict = {}
+        for doc_id, document in enumerate(documents):
+            counts: dict = {}
+            for token in tokenize(document):
+                counts[token] = counts.get(token, 0) + 1
+            doc_lengths[doc_id] = sum(counts.values())
+            for token, tf in counts.items():
+                term_ids.append(vocabulary.setdefault(token, len(vocabulary)))
+                doc_ids.append(doc_id)
+                tfs.append(tf)
+
+        self.vocabulary = vocabulary
+        self.num_docs = len(documents)
+        term_ids = np.array(term_ids, dtype=np.int64)
+        doc_ids = np.array(doc_ids, dtype=np.int32)
+        tfs = np.array(tfs, dtype=np.float32)
+
+        order = np.argsort(term_ids, kind="stable")
+        term_ids, doc_ids, tfs = term_ids[order], doc_ids[order], tfs[order]
+        df = np.bincount(term_ids, minlength=len(vocabulary))
+        self.offsets = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+
+        avgdl = doc_lengths.mean() if self.num_docs else 0.0
+        idf = np.log(1 + (self.num_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        norm = self.k1 * (1 - self.b + self.b * doc_lengths[doc_ids] / (avgdl or 1.0))
+        self.doc_ids = doc_ids
+        self.weights = (idf[term_ids] * tfs * (self.k1 + 1) / (tfs + norm)).astype(np.float32)
+        return self
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for query."""
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for token in set(tokenize(query)):
+            term_id = self.vocabulary.get(token)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            # A term lists each document once, so plain fancy-index add is safe
+            scores[self.doc_ids[start:end]] += self.weights[start:end]
+        return scores
+
+    def search(self, query: str, top_k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (doc ids, scores) of the top_k matching documents."""
+        scores = self.scores(query)
+        matched = np.flatnonzero(scores)
+        if top_k <= 0:
+            matched = matched[:0]
+        elif matched.size > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        order = matched[np.argsort(-scores[matched], kind="stable")]
+        return order, scores[order]
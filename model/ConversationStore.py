@@ -0,0 +1,216 @@
+import os
+import time
+import asyncio
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class ConversationStore(ABC):
+    """
+    Per-session chat history with bounded size.
+
+    Each session keeps at most max_messages messages; sessions idle for
+    longer than idle_ttl seconds are dropped, and the least recently used
+    session is dropped once max_sessions is exceeded. Request handlers use
+    the *_async methods, which backends doing blocking I/O run off the
+    event loop.
+    """
+
+    def __init__(self, max_sessions: Optional[int] = None, idle_ttl: Optional[float] = None, max_messages: Optional[int] = None):
+        self.max_sessions = max_sessions or int(os.getenv("CONVERSATION_MAX_SESSIONS", "10000"))
+        self.idle_ttl = idle_ttl if idle_ttl is not None else float(os.getenv("CONVERSATION_IDLE_TTL", "3600"))
+        self.max_messages = max_messages or int(os.getenv("CONVERSATION_MAX_MESSAGES", "20"))
+
+    @abstractmethod
+    def get_history(self, session_id: str) -> List[dict]:
+        """Return the session's messages as [{"role", "content"}], oldest first."""
+
+    @abstractmethod
+    def extend(self, session_id: str, messages: List[dict]):
+        """Append [{"role", "content"}] messages to the session in one step."""
+
+    def append(self, session_id: str, role: str, content: str):
+        self.extend(session_id, [{"role": role, "content": content}])
+
+    @abstractmethod
+    def clear(self, session_id: str):
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    async def get_history_async(self, session_id: str) -> List[dict]:
+        return self.get_history(session_id)
+
+    async def extend_async(self, session_id: str, messages: List[dict]):
+        self.extend(session_id, messages)
+
+
+class InMemoryConversationStore(ConversationStore):
+    """Process-local store; sessions are kept in access order with a ring buffer each."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sessions: "OrderedDict[str, deque]" = OrderedDict()
+        self.last_access: dict = {}
+
+    def _evict(self, now: float):
+        # Sessions are ordered by last access, so expired ones are at the front
+        while self.sessions:
+            session_id = next(iter(self.sessions))
+            if now - self.last_access[session_id] <= self.idle_ttl and len(self.sessions) <= self.max_sessions:
+                break
+            del self.sessions[session_id]
+            del self.last_access[session_id]
+
+    def _touch(self, session_id: str, create: bool = True) -> Optional[deque]:
+        now = time.monotonic()
+        # Expire first, so an idle session is not revived by touching it
+        self._evict(now)
+        messages = self.sessions.get(session_id)
+        if messages is None:
+            if not create:
+                return None
+            messages = deque(maxlen=self.max_messages)
+            self.sessions[session_id] = messages
+        else:
+            self.sessions.move_to_end(session_id)
+        self.last_access[session_id] = now
+        self._evict(now)
+        return messages
+
+    def get_history(self, session_id: str) -> List[dict]:
+        return [{"role": role, "content": content} for role, content in self._touch(session_id, create=False) or ()]
+
+    def extend(self, session_id: str, messages: List[dict]):
+        self._touch(session_id).extend((msg["role"], msg["content"]) for msg in messages)
+
+    def clear(self, session_id: str):
+        self.sessions.pop(session_id, None)
+        self.last_access.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+
+class SQLiteConversationStore(ConversationStore):
+    """
+    SQLite-backed store; history survives restarts and is shared by every
+    worker pointing at the same database file.
+    """
+
+    def __init__(self, path: Optional[str] = None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.path = path or os.getenv("CONVERSATION_DB_PATH", "conversations.db")
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_sessions_last_access ON sessions(last_access);
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, id);
+        """)
+        self.conn.commit()
+        # Idle sessions are swept at least this often, however few writes arrive
+        self.sweep_interval = min(self.idle_ttl, 60.0)
+        self.last_sweep = time.time()
+
+    def _touch(self, session_id: str):
+        self.conn.execute(
+            "INSERT INTO sessions(session_id, last_access) VALUES (?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET last_access = excluded.last_access",
+            (session_id, time.time()),
+        )
+
+    def _sweep(self, now: float):
+        """Drop sessions idle for longer than idle_ttl, then the least recently used beyond max_sessions."""
+        cutoff = now - self.idle_ttl
+        self.conn.execute("DELETE FROM sessions WHERE last_access < ?", (cutoff,))
+        self.conn.execute(
+            "DELETE FROM sessions WHERE session_id IN ("
+            "SELECT session_id FROM sessions ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,),
+        )
+        self.conn.execute("DELETE FROM messages WHERE session_id NOT IN (SELECT session_id FROM sessions)")
+        self.last_sweep = now
+
+    def get_history(self, session_id: str) -> List[dict]:
+        # Read-only: last_access is refreshed by extend, which every answered request makes.
+        # Sessions idle past idle_ttl read as empty even before a sweep removes them.
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT m.role, m.content FROM messages m JOIN sessions s ON s.session_id = m.session_id "
+                "WHERE m.session_id = ? AND s.last_access >= ? ORDER BY m.id DESC LIMIT ?",
+                (session_id, time.time() - self.idle_ttl, self.max_messages),
+            ).fetchall()
+        return [{"role": role, "content": content} for role, content in reversed(rows)]
+
+    def extend(self, session_id: str, messages: List[dict]):
+        now = time.time()
+        with self.lock:
+            # An expired session starts over instead of reviving its old turns
+            self.conn.execute(
+                "DELETE FROM messages WHERE session_id = ? AND session_id IN ("
+                "SELECT session_id FROM sessions WHERE last_access < ?)",
+                (session_id, now - self.idle_ttl),
+            )
+            self._touch(session_id)
+            self.conn.executemany(
+                "INSERT INTO messages(session_id, role, content) VALUES (?, ?, ?)",
+                [(session_id, msg["role"], msg["content"]) for msg in messages],
+            )
+            # Keep only the newest max_messages rows of the session
+            self.conn.execute(
+                "DELETE FROM messages WHERE session_id = ? AND id NOT IN ("
+                "SELECT id FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?)",
+                (session_id, session_id, self.max_messages),
+            )
+            if now - self.last_sweep >= self.sweep_interval or self._count(now - self.idle_ttl) > self.max_sessions:
+                self._sweep(now)
+            self.conn.commit()
+
+    def clear(self, session_id: str):
+        with self.lock:
+            self.conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self.conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self.conn.commit()
+
+    def _count(self, cutoff: float) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM sessions WHERE last_access >= ?", (cutoff,)).fetchone()[0]
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self._count(time.time() - self.idle_ttl)
+
+    async def get_history_async(self, session_id: str) -> List[dict]:
+        return await asyncio.to_thread(self.get_history, session_id)
+
+    async def extend_async(self, session_id: str, messages: List[dict]):
+        await asyncio.to_thread(self.extend, session_id, messages)
+
+
+def create_conversation_store() -> ConversationStore:
+    """Build the store selected by CONVERSATION_BACKEND (memory or sqlite)."""
+    backend = os.getenv("CONVERSATION_BACKEND", "memory").lower()
+    if backend == "sqlite":
+        return SQLiteConversationStore()
+    if backend == "memory":
+        return InMemoryConversationStore()
+    raise ValueError(f"Unknown CONVERSATION_BACKEND: {backend}")
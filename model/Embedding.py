@@ -1,15 +1,75 @@
-from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
+from typing import List, Optional
+import numpy as np
+import threading
 import os
 
 load_dotenv()
 
+_registry: dict = {}
+_registry_lock = threading.Lock()
+
 
 class EmbeddingModel:
-    def __init__(self):
-        self.model = SentenceTransformer(os.getenv("MODEL_PATH"))
+    def __init__(self, model_name: Optional[str] = None):
+        # Imported here so torch only loads when a model is actually built
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name or os.getenv("MODEL_PATH")
+        self.model = SentenceTransformer(self.model_name)
+        self.batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
     
     def encode(self, data: str):
         return self.model.encode(data).tolist()
 
-    
\ No newline at end of file
+    def encode_batch(self, texts: List[str], batch_size: Optional[int] = None, normalize: bool = False) -> np.ndarray:
+        """
+        Encode many texts with batched forward passes.
+
+        Texts are sorted by length before batching so each batch pads to a
+        similar length; rows are returned in the original order.
+
+        :param texts: Texts to encode
+        :param batch_size: Texts per forward pass, defaults to EMBEDDING_BATCH_SIZE
+        :param normalize: Return L2-normalized vectors
+        :return: float32 array of shape (len(texts), dim)
+        """
+        batch_size = batch_size or self.batch_size
+        if not texts:
+            dim = self.model.get_sentence_embedding_dimension() or 0
+            return np.empty((0, dim), dtype=np.float32)
+
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        result = None
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            vectors = self.model.encode(
+                [texts[i] for i in rows],
+                batch_size=len(rows),
+                convert_to_numpy=True,
+                normalize_embeddings=normalize,
+                show_progress_bar=False,
+            )
+            if result is None:
+                result = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            result[rows] = vectors
+        return result
+
+
+def get_embedding_model(model_name: Optional[str] = None) -> EmbeddingModel:
+    """
+    Return the process-wide EmbeddingModel for model_name, loading it once.
+
+    RAG, the startup code and any other component should go through this so a
+    worker holds a single copy of the weights. Each worker process still loads
+    its own copy.
+    """
+    model_name = model_name or os.getenv("MODEL_PATH")
+    model = _registry.get(model_name)
+    if model is None:
+        with _registry_lock:
+            model = _registry.get(model_name)
+            if model is None:
+                model = EmbeddingModel(model_name)
+                _registry[model_name] = model
+    return model
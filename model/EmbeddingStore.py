@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+from typing import Callable, Dict, List, Optional
+from dotenv import load_dotenv
+from .FileLock import file_lock
+
+load_dotenv()
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Persistent embedding cache keyed by model name and content hash.
+
+    Each save writes the vectors to a new, uniquely named ``embeddings-*.npy``
+    and then atomically replaces ``manifest.json``, which names that file and
+    lists the content hash of each row. A reader therefore always sees a
+    matrix together with its own hash list, even while another worker saves.
+    Only texts whose hash is missing are sent to the encoder.
+    """
+
+    def __init__(self, model_name: str, cache_dir: Optional[str] = None):
+        self.model_name = model_name
+        cache_dir = cache_dir or os.getenv("EMBEDDING_CACHE_DIR", ".cache/embeddings")
+        model_key = hashlib.sha1(model_name.encode("utf-8")).hexdigest()[:16]
+        self.directory = os.path.join(cache_dir, model_key)
+        self.manifest_path = os.path.join(self.directory, "manifest.json")
+        self.lock_path = os.path.join(self.directory, "commit.lock")
+
+    def _read_manifest(self) -> Optional[dict]:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load(self) -> Dict[str, np.ndarray]:
+        """Return {content_hash: vector} for everything on disk (rows are mmap views)."""
+        manifest = self._read_manifest()
+        if manifest is None or manifest.get("model") != self.model_name or "matrix" not in manifest:
+            return {}
+        try:
+            matrix = np.load(os.path.join(self.directory, manifest["matrix"]), mmap_mode="r")
+        except (OSError, ValueError) as e:
+            print(f"Embedding cache unreadable, rebuilding: {e}")
+            return {}
+        hashes = manifest.get("hashes", [])
+        if len(hashes) != len(matrix):
+            return {}
+        return {h: matrix[i] for i, h in enumerate(hashes)}
+
+    def _write_temp(self, suffix: str, write: Callable) -> str:
+        fd, path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-", suffix=suffix)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+        except BaseException:
+            os.remove(path)
+            raise
+        return path
+
+    def save(self, hashes: List[str], matrix: np.ndarray):
+        """Atomically replace the cache with the given rows; call while holding the commit lock."""
+        os.makedirs(self.directory, exist_ok=True)
+        previous = (self._read_manifest() or {}).get("matrix")
+        matrix_path = self._write_temp(".npy", lambda f: np.save(f, np.ascontiguousarray(matrix, dtype=np.float32)))
+        matrix_name = "embeddings-" + os.path.basename(matrix_path)[len(".tmp-"):]
+        os.replace(matrix_path, os.path.join(self.directory, matrix_name))
+        manifest = {"model": self.model_name, "dim": int(matrix.shape[1]), "matrix": matrix_name, "hashes": hashes}
+        manifest_path = self._write_temp(".json", lambda f: f.write(json.dumps(manifest).encode("utf-8")))
+        os.replace(manifest_path, self.manifest_path)
+        # Keep the previous matrix for readers that loaded the old manifest a moment ago
+        for name in os.listdir(self.directory):
+            if name.startswith("embeddings") and name.endswith(".npy") and name not in (matrix_name, previous):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def begin(self):
+        """Start an encoding session; call lookup() per batch, then commit()."""
+        self._cached = self.load()
+        self._used: Dict[str, None] = {}
+        self._encoded = 0
+
+    def lookup(self, texts: List[str], encoder: Callable[[List[str]], object]) -> np.ndarray:
+        """
+        Return embeddings for texts, encoding only new or changed ones.
+
+        :param texts: Texts to embed, in output row order
+        :param encoder: Callable mapping a list of texts to a 2D array-like of vectors
+        :return: float32 array with one row per text
+        """
+        hashes = [content_hash(text) for text in texts]
+        missing = {}
+        for h, text in zip(hashes, texts):
+            self._used[h] = None
+            if h not in self._cached and h not in missing:
+                missing[h] = text
+
+        if missing:
+            vectors = np.asarray(encoder(list(missing.values())), dtype=np.float32)
+            self._cached.update(zip(missing.keys(), vectors))
+            self._encoded += len(missing)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.array([self._cached[h] for h in hashes], dtype=np.float32)
+
+    def commit(self):
+        """Persist new vectors, keeping only the texts seen in this session."""
+        unique = list(self._used)
+        if self._encoded:
+            print(f"Encoded {self._encoded} new chunks ({len(unique) - self._encoded} cached)")
+        if unique and (self._encoded or len(self._cached) != len(unique)):
+            # Keep only the current corpus so the cache does not grow forever
+            rows = np.array([self._cached[h] for h in unique], dtype=np.float32)
+            self._cached = None  # drop mmap views before the file is replaced
+            os.makedirs(self.directory, exist_ok=True)
+            # Workers warming up together take turns; the last one to save wins
+            with file_lock(self.lock_path):
+                self.save(unique, rows)
+        self._cached = None
+        self._used = {}
+
+    def encode(self, texts: List[str], encoder: Callable[[List[str]], object]) -> np.ndarray:
+        """One-shot lookup() + commit() for a whole corpus."""
+        self.begin()
+        matrix = self.lookup(texts, encoder)
+        self.commit()
+        return matrix
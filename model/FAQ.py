@@ -0,0 +1,114 @@
+import os
+import re
+import numpy as np
+from typing import Dict, List, NamedTuple, Optional, Sequence
+from dotenv import load_dotenv
+from .Embedding import EmbeddingModel
+from .Metrics import REGISTRY
+from .RAG import normalize_rows
+from .SingleFlight import normalize_query
+
+load_dotenv()
+
+FAQ_LOOKUPS = REGISTRY.counter("chatbot_faq_lookups_total", "FAQ fast-path lookups by result (exact, semantic, miss)", ("result",))
+
+
+def question_key(text: str) -> str:
+    """Normalized question text: case, spacing and punctuation are ignored."""
+    return normalize_query(re.sub(r"[^\w\s]", " ", text))
+
+
+class FAQMatch(NamedTuple):
+    question: str
+    answer: str
+    score: float
+    method: str
+
+
+class FAQIndex:
+    """
+    Question-to-answer lookup over the FAQ chunks, used to skip the LLM.
+
+    A query is answered directly when its normalized text equals a stored
+    question, or when its embedding has cosine similarity >= threshold with
+    one question and beats the best question with a different answer by at
+    least margin. Everything else falls through to retrieval and the LLM.
+    """
+
+    def __init__(self, threshold: Optional[float] = None, margin: Optional[float] = None):
+        self.threshold = threshold if threshold is not None else float(os.getenv("FAQ_MATCH_THRESHOLD", "0.9"))
+        self.margin = margin if margin is not None else float(os.getenv("FAQ_MATCH_MARGIN", "0.05"))
+        self.questions: List[str] = []
+        self.answers: List[str] = []
+        # Rows with the same answer text share an id, so duplicates are not each other's runner-up
+        self.answer_ids = np.empty(0, dtype=np.int32)
+        self.exact: Dict[str, int] = {}
+        self.matrix: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    def build(self, chunks: Sequence[dict], embedding: EmbeddingModel) -> "FAQIndex":
+        """
+        Index the FAQ chunks of a corpus; answers that were split into several chunks are skipped.
+
+        :param chunks: Indexed chunks ({'text', 'metadata'}); FAQ chunks have metadata source == "faq"
+        :param embedding: Model used to embed the question texts
+        :return: self
+        """
+        questions, answers = [], []
+        for chunk in chunks:
+            metadata = chunk.get('metadata') or {}
+            if metadata.get("source") != "faq" or metadata.get("part") is not None or not metadata.get("title"):
+                continue
+            questions.append(metadata["title"])
+            answers.append(chunk.get('text', chunk.get('content', '')))
+
+        answer_codes: Dict[str, int] = {}
+        exact: Dict[str, int] = {}
+        ambiguous = set()
+        for row, (question, answer) in enumerate(zip(questions, answers)):
+            answer_codes.setdefault(answer, len(answer_codes))
+            key = question_key(question)
+            if key in exact and answers[exact[key]] != answer:
+                ambiguous.add(key)
+            exact.setdefault(key, row)
+        for key in ambiguous:
+            del exact[key]
+
+        self.questions, self.answers, self.exact = questions, answers, exact
+        self.answer_ids = np.array([answer_codes[answer] for answer in answers], dtype=np.int32)
+        self.matrix = normalize_rows(np.array(embedding.encode_batch(questions), dtype=np.float32)) if questions else None
+        print(f"FAQ index: {len(questions)} questions")
+        return self
+
+    def match_text(self, query: str) -> Optional[FAQMatch]:
+        """Exact match on the normalized question text; needs no embedding."""
+        row = self.exact.get(question_key(query))
+        if row is None:
+            return None
+        FAQ_LOOKUPS.inc("exact")
+        return FAQMatch(self.questions[row], self.answers[row], 1.0, "exact")
+
+    def match(self, query_embedding) -> Optional[FAQMatch]:
+        """
+        Semantic match of a query embedding against the stored questions.
+
+        :return: The matched question and answer, or None when no question is
+            close enough or the runner-up is within margin
+        """
+        if self.matrix is None or query_embedding is None:
+            FAQ_LOOKUPS.inc("miss")
+            return None
+        query = np.asarray(query_embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        scores = self.matrix @ (query / norm if norm else query)
+        row = int(np.argmax(scores))
+        best = float(scores[row])
+        others = scores[self.answer_ids != self.answer_ids[row]]
+        runner_up = float(others.max()) if others.size else -1.0
+        if best < self.threshold or best - runner_up < self.margin:
+            FAQ_LOOKUPS.inc("miss")
+            return None
+        FAQ_LOOKUPS.inc("semantic")
+        return FAQMatch(self.questions[row], self.answers[row], best, "semantic")
@@ -1,19 +1,54 @@
 import os
-import google.generativeai as genai
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from typing import List, Optional
+from .Prompt import PromptBuilder
+from .Metrics import PROMPT_TOKENS
+from typing import AsyncIterator, Iterator, List, Optional
 
 load_dotenv()
 
+NO_CONTEXT_RESPONSE = "Sorry, I could not find relevant information to answer your question."
+TIMEOUT_RESPONSE = "Sorry, the response took too long. Please try again."
+ERROR_RESPONSE_PREFIX = "Sorry, an error occurred"
+
+
+def is_error_response(text: str) -> bool:
+    """True for timeout/error fallbacks, which must not be cached or reused."""
+    return text == TIMEOUT_RESPONSE or text.startswith(ERROR_RESPONSE_PREFIX)
+
+
+def _chunk_text(chunk) -> str:
+    # Gemini raises on .text for chunks without text parts (e.g. safety stops)
+    try:
+        return chunk.text or ""
+    except ValueError:
+        return ""
+
 
 class GeminiLLM:
-    def __init__(self):
-        self.api_key = os.getenv("GEMINI_API_KEY")
-        if not self.api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment variables")
+    def __init__(self, model=None):
+        """
+        :param model: Optional backend exposing generate_content (and optionally
+            generate_content_async); defaults to Gemini. Useful for a local fake.
+        """
+        if model is None:
+            # Deferred: the Gemini SDK is slow to import and only needed here
+            import google.generativeai as genai
+
+            self.api_key = os.getenv("GEMINI_API_KEY")
+            if not self.api_key:
+                raise ValueError("GEMINI_API_KEY not found in environment variables")
+            
+            genai.configure(api_key=self.api_key)
+            model = genai.GenerativeModel("gemini-2.0-flash")
+        self.model = model
         
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel("gemini-2.0-flash")
+        self.max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+        self.timeout = float(os.getenv("LLM_TIMEOUT", "60"))
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="llm")
         
         self.system_prompt = """You are an AI assistant helping users with the household and population management system.
 
@@ -26,6 +61,31 @@ Response rules:
 6. Use polite and friendly language, refuse to answer offensive or inappropriate language by saying
 "I'm sorry, I cannot answer this question."
 """
+        self.prompt_builder = PromptBuilder(self.system_prompt)
+        self.last_prompt_tokens = 0
+
+    def build_prompt(
+        self, 
+        query: str, 
+        rag_results: List[tuple],
+        conversation_history: Optional[List[dict]] = None,
+        min_score: float = 0.3
+    ) -> Optional[str]:
+        """
+        Build the Gemini prompt from RAG retrieval results within PROMPT_TOKEN_BUDGET.
+        
+        :param query: User's question
+        :param rag_results: List of (chunk, score) from RAG.retrieve()
+        :param conversation_history: Previous conversation messages
+        :param min_score: Minimum similarity score to include
+        :return: Prompt, or None when no chunk passes min_score
+        """
+        built = self.prompt_builder.build(query, rag_results, conversation_history, min_score)
+        if built is None:
+            return None
+        prompt, self.last_prompt_tokens = built
+        PROMPT_TOKENS.observe(self.last_prompt_tokens)
+        return prompt
 
     def generate_response(
         self, 
@@ -43,44 +103,124 @@ Response rules:
         :param min_score: Minimum similarity score to include
         :return: Generated response
         """
-        # Filter and extract context from RAG results
-        context_parts = []
-        for chunk, score in rag_results:
-            if score >= min_score:
-                text = chunk.get('text', chunk.get('content', ''))
-                if text:
-                    context_parts.append(f"[Score: {score:.2f}] {text}")
-        
-        if not context_parts:
-            return "Sorry, I could not find relevant information to answer your question."
-        
-        context = "\n\n".join(context_parts)
-        
-        # Build conversation history string
-        history_str = ""
-        if conversation_history and len(conversation_history) > 0:
-            recent_history = conversation_history[-6:]
-            history_parts = []
-            for msg in recent_history:
-                role = "User" if msg.get("role") == "user" else "Assistant"
-                history_parts.append(f"{role}: {msg.get('content', '')}")
-            history_str = "\n".join(history_parts)
-        
-        prompt = f"""{self.system_prompt}
+        prompt = self.build_prompt(query, rag_results, conversation_history, min_score)
+        if prompt is None:
+            return NO_CONTEXT_RESPONSE
 
-### Conversation History:
-{history_str if history_str else "(None)"}
+        try:
+            response = self.model.generate_content(prompt)
+            return response.text
+        except Exception as e:
+            return f"{ERROR_RESPONSE_PREFIX}: {str(e)}"
 
-### Reference Information (Context):
-{context}
+    async def _generate_async(self, prompt: str):
+        if hasattr(self.model, "generate_content_async"):
+            return await self.model.generate_content_async(prompt)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.model.generate_content, prompt)
 
-### Current Question:
-{query}
+    async def generate_response_async(
+        self, 
+        query: str, 
+        rag_results: List[tuple],
+        conversation_history: Optional[List[dict]] = None,
+        min_score: float = 0.3,
+        timeout: Optional[float] = None
+    ) -> str:
+        """
+        Non-blocking variant of generate_response.
 
-### Answer:"""
+        At most LLM_MAX_CONCURRENCY calls run at once; each one is bounded by
+        timeout (LLM_TIMEOUT by default). Cancelling the awaiting task, e.g.
+        when a WebSocket client disconnects, cancels the call.
+        """
+        prompt = self.build_prompt(query, rag_results, conversation_history, min_score)
+        if prompt is None:
+            return NO_CONTEXT_RESPONSE
 
         try:
-            response = self.model.generate_content(prompt)
+            async with self.semaphore:
+                response = await asyncio.wait_for(self._generate_async(prompt), timeout or self.timeout)
             return response.text
+        except asyncio.TimeoutError:
+            return TIMEOUT_RESPONSE
         except Exception as e:
-            return f"Sorry, an error occurred: {str(e)}"
+            return f"{ERROR_RESPONSE_PREFIX}: {str(e)}"
+
+    def stream_response(
+        self, 
+        query: str, 
+        rag_results: List[tuple],
+        conversation_history: Optional[List[dict]] = None,
+        min_score: float = 0.3
+    ) -> Iterator[str]:
+        """
+        Yield response text deltas as Gemini produces them.
+        
+        Takes the same arguments as generate_response.
+        """
+        prompt = self.build_prompt(query, rag_results, conversation_history, min_score)
+        if prompt is None:
+            yield NO_CONTEXT_RESPONSE
+            return
+
+        try:
+            for chunk in self.model.generate_content(prompt, stream=True):
+                text = _chunk_text(chunk)
+                if text:
+                    yield text
+        except Exception as e:
+            yield f"{ERROR_RESPONSE_PREFIX}: {str(e)}"
+
+    async def _stream_async(self, prompt: str, timeout: float) -> AsyncIterator[str]:
+        if hasattr(self.model, "generate_content_async"):
+            response = await asyncio.wait_for(self.model.generate_content_async(prompt, stream=True), timeout)
+            iterator = response.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(iterator.__anext__(), timeout)
+                except StopAsyncIteration:
+                    return
+                text = _chunk_text(chunk)
+                if text:
+                    yield text
+        else:
+            loop = asyncio.get_running_loop()
+            start = functools.partial(self.model.generate_content, prompt, stream=True)
+            iterator = iter(await asyncio.wait_for(loop.run_in_executor(self.executor, start), timeout))
+            done = object()
+            while True:
+                chunk = await asyncio.wait_for(loop.run_in_executor(self.executor, next, iterator, done), timeout)
+                if chunk is done:
+                    return
+                text = _chunk_text(chunk)
+                if text:
+                    yield text
+
+    async def stream_response_async(
+        self, 
+        query: str, 
+        rag_results: List[tuple],
+        conversation_history: Optional[List[dict]] = None,
+        min_score: float = 0.3,
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """
+        Non-blocking variant of stream_response.
+
+        Holds a concurrency slot for the whole stream; each delta must arrive
+        within timeout.
+        """
+        prompt = self.build_prompt(query, rag_results, conversation_history, min_score)
+        if prompt is None:
+            yield NO_CONTEXT_RESPONSE
+            return
+
+        async with self.semaphore:
+            try:
+                async for text in self._stream_async(prompt, timeout or self.timeout):
+                    yield text
+            except asyncio.TimeoutError:
+                yield TIMEOUT_RESPONSE
+            except Exception as e:
+                yield f"{ERROR_RESPONSE_PREFIX}: {str(e)}"
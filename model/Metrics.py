@@ -0,0 +1,256 @@
+import os
+import sys
+import time
+import asyncio
+import random
+import threading
+from bisect import bisect_left
+from collections import Counter as FrameCounter
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (128, 256, 512, 1024, 2048, 4096, 6000, 8192, 16384)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, rendered in Prometheus format."""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last is +Inf), sum]
+        self.series: Dict[tuple, list] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = [(values, list(counts), total) for values, (counts, total) in self.series.items()]
+        for values, counts, total in sorted(series):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, values)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, values)} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values: Dict[tuple, float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def get(self, *label_values: str) -> float:
+        return self.values.get(label_values, 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            items = sorted(self.values.items())
+        lines.extend(f"{self.name}{_format_labels(self.labels, values)} {value}" for values, value in items)
+        return lines
+
+
+class Gauge:
+    """Gauge read from a callback at scrape time, so the hot path pays nothing."""
+
+    def __init__(self, name: str, help_text: str, read: Callable[[], float]):
+        self.name = name
+        self.help = help_text
+        self.read = read
+
+    def render(self) -> list:
+        try:
+            value = float(self.read())
+        except Exception:
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {value}"]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        # Re-registering a name replaces it, e.g. when an app module is reloaded
+        self.metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], float]) -> Gauge:
+        return self.register(Gauge(name, help_text, read))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+STAGE_SECONDS = REGISTRY.histogram("chatbot_stage_seconds", "Time spent per request stage", ("stage",))
+REQUEST_SECONDS = REGISTRY.histogram("chatbot_request_seconds", "End-to-end request latency", ("endpoint",))
+REQUESTS_TOTAL = REGISTRY.counter("chatbot_requests_total", "Handled requests", ("endpoint", "status"))
+TTFT_SECONDS = REGISTRY.histogram("chatbot_ttft_seconds", "Time to first streamed token", ("endpoint",))
+CACHE_LOOKUPS = REGISTRY.counter("chatbot_answer_cache_lookups_total", "Semantic answer cache lookups", ("result",))
+PROMPT_TOKENS = REGISTRY.histogram("chatbot_prompt_tokens", "Estimated tokens per assembled prompt", buckets=TOKEN_BUCKETS)
+
+
+class SamplingProfiler:
+    """
+    Stack-sampling profiler for a fraction of requests.
+
+    While at least one sampled trace is open, a daemon thread records the
+    innermost repo frame of every other thread each interval. Samples are
+    credited to all open sampled traces, so under concurrency a trace also
+    sees its neighbours' work; it is meant to point at hot spots, not to
+    attribute exact time.
+    """
+
+    def __init__(self, interval_ms: Optional[float] = None):
+        self.interval = (interval_ms or float(os.getenv("PROFILE_INTERVAL_MS", "5"))) / 1000
+        self.root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.active: set = set()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def _frame_key(self, frame) -> Optional[str]:
+        # Innermost frame in repo code; threads idling outside it are skipped
+        while frame is not None:
+            code = frame.f_code
+            if code.co_filename.startswith(self.root) and code.co_name != "<module>" and "site-packages" not in code.co_filename:
+                return f"{code.co_name} ({os.path.relpath(code.co_filename, self.root)}:{frame.f_lineno})"
+            frame = frame.f_back
+        return None
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            frames = [self._frame_key(frame) for ident, frame in sys._current_frames().items() if ident != own]
+            frames = [frame for frame in frames if frame is not None]
+            # Updating under the lock means a stopped trace is never written to again
+            with self.lock:
+                if not self.active:
+                    self.thread = None
+                    return
+                for trace in self.active:
+                    trace.samples.update(frames)
+            time.sleep(self.interval)
+
+    def start(self, trace: "RequestTrace"):
+        with self.lock:
+            self.active.add(trace)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self.thread.start()
+
+    def stop(self, trace: "RequestTrace"):
+        with self.lock:
+            self.active.discard(trace)
+
+
+class RequestTrace:
+    """Per-request stage timings, also fed into the process-wide histograms."""
+
+    def __init__(self, endpoint: str, profiler: Optional[SamplingProfiler] = None):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.samples: FrameCounter = FrameCounter()
+        self.profiler = profiler
+        if profiler is not None:
+            profiler.start(self)
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        STAGE_SECONDS.observe(seconds, name)
+
+
+class Tracer:
+    """
+    Opens request traces and reports slow ones.
+
+    SLOW_REQUEST_MS (0 disables) logs the stage breakdown of requests slower
+    than the threshold; PROFILE_SAMPLE_RATE is the fraction of requests run
+    under the sampling profiler, whose top frames are logged when slow.
+    """
+
+    def __init__(self, slow_ms: Optional[float] = None, sample_rate: Optional[float] = None):
+        self.slow = (slow_ms if slow_ms is not None else float(os.getenv("SLOW_REQUEST_MS", "0"))) / 1000
+        self.sample_rate = sample_rate if sample_rate is not None else float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+        self.profiler = SamplingProfiler() if self.sample_rate > 0 else None
+
+    def start(self, endpoint: str) -> RequestTrace:
+        sampled = self.profiler is not None and random.random() < self.sample_rate
+        return RequestTrace(endpoint, self.profiler if sampled else None)
+
+    def finish(self, trace: RequestTrace, status: str = "ok"):
+        elapsed = time.perf_counter() - trace.started
+        if trace.profiler is not None:
+            trace.profiler.stop(trace)
+        REQUEST_SECONDS.observe(elapsed, trace.endpoint)
+        REQUESTS_TOTAL.inc(trace.endpoint, status)
+        if self.slow and elapsed >= self.slow:
+            breakdown = ", ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in trace.stages.items())
+            print(f"Slow request {trace.endpoint}: {elapsed * 1000:.1f}ms ({breakdown})")
+            for frame, count in trace.samples.most_common(10):
+                print(f"    {count:>5} samples  {frame}")
+
+    @contextmanager
+    def request(self, endpoint: str):
+        trace = self.start(endpoint)
+        status = "ok"
+        try:
+            yield trace
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.finish(trace, status)
@@ -0,0 +1,164 @@
+import os
+import re
+from functools import lru_cache
+from typing import List, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+@lru_cache(maxsize=1)
+def _load_tokenizer(name: str):
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(name)
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    """
+    Token count of text, cached per string.
+
+    Uses the Hugging Face tokenizer named by PROMPT_TOKENIZER when set,
+    otherwise counts words and punctuation marks, which tracks Gemini's
+    count closely enough for budgeting.
+    """
+    name = os.getenv("PROMPT_TOKENIZER")
+    if name:
+        return len(_load_tokenizer(name).encode(text, add_special_tokens=False))
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to at most max_tokens tokens, marker included; empty when not even the marker fits."""
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    cut = int(len(text) * max_tokens / tokens)
+    while cut > 0:
+        # Back off to a word boundary so the cut does not split a word
+        boundary = text.rfind(" ", 0, cut)
+        cut = boundary if boundary > 0 else cut
+        truncated = text[:cut].rstrip() + " ..."
+        tokens = count_tokens(truncated)
+        if tokens <= max_tokens:
+            return truncated
+        # Tokens are not spread evenly over the text; shrink by the overshoot and re-check
+        cut = min(cut - 1, int(cut * max_tokens / tokens))
+    return ""
+
+
+def _word_set(text: str) -> frozenset:
+    return frozenset(word.lower() for word in re.findall(r"\w+", text))
+
+
+class PromptBuilder:
+    """
+    Assembles the Gemini prompt within a token budget.
+
+    The system prompt and section headers are rendered once. Context chunks
+    are added in retrieval order (best first), near-duplicates are skipped
+    and the last one that does not fit is truncated; history fills what is
+    left, newest turn first, so the lowest-ranked chunks and oldest turns
+    are dropped first. A query longer than max_query_share of the budget is
+    truncated, so a long message cannot crowd out all context.
+    """
+
+    def __init__(
+        self,
+        system_prompt: str,
+        token_budget: Optional[int] = None,
+        history_messages: int = 6,
+        min_chunk_tokens: int = 64,
+        duplicate_threshold: float = 0.9,
+        max_query_share: float = 0.5
+    ):
+        self.token_budget = token_budget or int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+        self.history_messages = history_messages
+        self.min_chunk_tokens = min_chunk_tokens
+        self.duplicate_threshold = duplicate_threshold
+        self.max_query_share = max_query_share
+        self.head = f"{system_prompt}\n\n### Conversation History:\n"
+        self.context_header = "\n\n### Reference Information (Context):\n"
+        self.question_header = "\n\n### Current Question:\n"
+        self.tail = "\n\n### Answer:"
+        self.no_history = "(None)"
+        self.fixed_tokens = sum(count_tokens(part) for part in (self.head, self.context_header, self.question_header, self.tail))
+
+    def _is_duplicate(self, words: frozenset, kept: List[frozenset]) -> bool:
+        for other in kept:
+            union = len(words | other)
+            if union and len(words & other) / union >= self.duplicate_threshold:
+                return True
+        return False
+
+    def _context(self, rag_results: List[tuple], min_score: float, budget: int) -> Tuple[List[str], int]:
+        parts, kept_words, used = [], [], 0
+        for chunk, score in rag_results:
+            if score < min_score:
+                continue
+            text = chunk.get('text', chunk.get('content', ''))
+            if not text:
+                continue
+            words = _word_set(text)
+            if self._is_duplicate(words, kept_words):
+                continue
+            part = f"[Score: {score:.2f}] {text}"
+            tokens = count_tokens(part)
+            remaining = budget - used
+            if tokens > remaining:
+                if remaining < self.min_chunk_tokens:
+                    continue
+                part = truncate_to_tokens(part, remaining)
+                if not part:
+                    continue
+                tokens = count_tokens(part)
+            parts.append(part)
+            kept_words.append(words)
+            used += tokens
+        return parts, used
+
+    def _history(self, conversation_history: Optional[List[dict]], budget: int) -> Tuple[List[str], int]:
+        lines, used = [], 0
+        for msg in reversed((conversation_history or [])[-self.history_messages:]):
+            role = "User" if msg.get("role") == "user" else "Assistant"
+            line = f"{role}: {msg.get('content', '')}"
+            tokens = count_tokens(line)
+            if used + tokens > budget:
+                break
+            lines.append(line)
+            used += tokens
+        lines.reverse()
+        return lines, used
+
+    def build(
+        self,
+        query: str,
+        rag_results: List[tuple],
+        conversation_history: Optional[List[dict]] = None,
+        min_score: float = 0.3
+    ) -> Optional[Tuple[str, int]]:
+        """
+        :return: (prompt, estimated token count), or None when no chunk passes min_score
+        """
+        available = self.token_budget - self.fixed_tokens
+        query = truncate_to_tokens(query, int(available * self.max_query_share))
+        query_tokens = count_tokens(query)
+        budget = available - query_tokens
+        # Room for the placeholder shown when no history turn fits
+        context_parts, context_tokens = self._context(rag_results, min_score, budget - count_tokens(self.no_history))
+        if not context_parts:
+            return None
+
+        history_lines, history_tokens = self._history(conversation_history, budget - context_tokens)
+        history_str = "\n".join(history_lines) if history_lines else self.no_history
+        if not history_lines:
+            history_tokens = count_tokens(history_str)
+        prompt = (
+            self.head + history_str
+            + self.context_header + "\n\n".join(context_parts)
+            + self.question_header + query
+            + self.tail
+        )
+        return prompt, self.fixed_tokens + query_tokens + context_tokens + history_tokens
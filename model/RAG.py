@@ -1,14 +1,447 @@
 import os
-from .Embedding import EmbeddingModel
+import json
+import asyncio
+import tempfile
+from .Embedding import EmbeddingModel, get_embedding_model
+from .EmbeddingBatcher import EmbeddingBatcher
+from .BM25 import BM25Index
+from .Reranker import CrossEncoderReranker
 import numpy as np
-from typing import List, Tuple
+from typing import List, Optional, Tuple
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row in place; zero rows stay zero."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Indices of the top_k highest scores, best first, using a partial sort."""
+    if top_k <= 0 or scores.size == 0:
+        return np.empty(0, dtype=np.int64)
+    if top_k < scores.size:
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        candidates = np.arange(scores.size)
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+# float16 is left out: numpy has no fast half-to-single conversion, so upcasting
+# it while scoring is ~5x slower than float32, while int8 is smaller and faster
+STORAGE_DTYPES = {"float32": np.float32, "int8": np.int8}
+SCORE_BLOCK_ROWS = 1024
+
+
+def quantize_rows(matrix: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Compact copy of a normalized float32 matrix.
+
+    int8 uses symmetric per-row scales (row = codes * scale); float32 needs
+    no scales.
+
+    :return: (codes, per-row float32 scales or None)
+    """
+    if dtype not in STORAGE_DTYPES:
+        raise ValueError(f"Unknown INDEX_DTYPE: {dtype} (expected one of {', '.join(STORAGE_DTYPES)})")
+    if dtype != "int8":
+        return np.ascontiguousarray(matrix, dtype=STORAGE_DTYPES[dtype]), None
+    codes = np.empty(matrix.shape, dtype=np.int8)
+    scales = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), SCORE_BLOCK_ROWS):
+        block = matrix[start:start + SCORE_BLOCK_ROWS]
+        block_scales = np.abs(block).max(axis=1) / 127
+        block_scales[block_scales == 0] = 1.0
+        codes[start:start + SCORE_BLOCK_ROWS] = np.rint(block / block_scales[:, None])
+        scales[start:start + SCORE_BLOCK_ROWS] = block_scales
+    return codes, scales
+
+
+class MetadataColumns:
+    """
+    Columnar chunk metadata with precomputed row masks.
+
+    Each key is stored as an int32 code column; masks for every feature and
+    header value are built up front so a filter is a few boolean ANDs.
+    """
+
+    KEYS = ("header", "section", "feature", "title")
+    PRECOMPUTED = ("feature", "header")
+
+    def __init__(self, chunks: List[dict]):
+        self.size = len(chunks)
+        self.values: dict = {}
+        self.codes: dict = {}
+        for key in self.KEYS:
+            lookup: dict = {}
+            column = [(chunk.get('metadata') or {}).get(key) for chunk in chunks]
+            self.codes[key] = np.array([lookup.setdefault(value, len(lookup)) for value in column], dtype=np.int32)
+            self.values[key] = lookup
+        self._precompute()
+
+    @classmethod
+    def from_codes(cls, size: int, codes: dict, values: dict) -> "MetadataColumns":
+        """
+        Wrap existing code columns, e.g. memory-mapped ones, without copying.
+
+        :param codes: {key: int32 array of codes}; keys missing here are all None
+        :param values: {key: {value: code}}
+        """
+        columns = cls.__new__(cls)
+        columns.size = size
+        columns.codes, columns.values = {}, {}
+        for key in cls.KEYS:
+            if key in codes:
+                columns.codes[key], columns.values[key] = codes[key], values[key]
+            else:
+                columns.codes[key], columns.values[key] = np.zeros(size, dtype=np.int32), {None: 0}
+        columns._precompute()
+        return columns
+
+    def _precompute(self):
+        self.masks: dict = {}
+        for key in self.PRECOMPUTED:
+            for value, code in self.values[key].items():
+                self.masks[(key, value)] = self.codes[key] == code
+
+    def mask(self, key: str, value) -> np.ndarray:
+        if (key, value) in self.masks:
+            return self.masks[(key, value)]
+        if key not in self.codes:
+            raise ValueError(f"Unknown metadata filter: {key}")
+        code = self.values[key].get(value)
+        if code is None:
+            return np.zeros(self.size, dtype=bool)
+        return self.codes[key] == code
+
+    def rows(self, filters: dict) -> np.ndarray:
+        """
+        Row indices matching filters.
+
+        :param filters: {key: value or list of values}; keys are ANDed, list values ORed
+        """
+        selected = np.ones(self.size, dtype=bool)
+        for key, value in filters.items():
+            options = value if isinstance(value, (list, tuple, set)) else [value]
+            allowed = np.zeros(self.size, dtype=bool)
+            for option in options:
+                allowed |= self.mask(key, option)
+            selected &= allowed
+        return np.flatnonzero(selected)
+
+
+class VectorIndex:
+    """
+    Exact cosine-similarity index.
+
+    Chunk embeddings live in one contiguous, pre-normalized matrix so a query
+    is scored with a single matrix-vector product. The matrix is stored as
+    float32 or int8 with per-row scales (INDEX_DTYPE). int8 matrices are
+    upcast block by block while scoring. With
+    INDEX_RESCORE_CANDIDATES > 0, that many top candidates are re-scored
+    against float32 rows spilled to a temporary memory-mapped file, so only
+    the pages of candidate rows are resident.
+    """
+
+    kind = "exact"
+
+    def __init__(self, chunks: Optional[List[dict]] = None, dtype: Optional[str] = None, rescore_candidates: Optional[int] = None):
+        self.chunks: List[dict] = []
+        self.source: Optional[List[dict]] = None
+        self.dtype = (dtype or os.getenv("INDEX_DTYPE", "float32")).lower()
+        if self.dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Unknown INDEX_DTYPE: {self.dtype} (expected one of {', '.join(STORAGE_DTYPES)})")
+        self.rescore_candidates = rescore_candidates if rescore_candidates is not None else int(os.getenv("INDEX_RESCORE_CANDIDATES", "0"))
+        self.matrix = np.empty((0, 0), dtype=STORAGE_DTYPES[self.dtype])
+        self.scales: Optional[np.ndarray] = None
+        # float32 rows for re-scoring; a memmap, so mostly not resident
+        self.full: Optional[np.ndarray] = None
+        # Set when the index is attached from a shared, generation-numbered snapshot
+        self.generation: Optional[int] = None
+        # Optional side structures over the same rows, attached by RAG.build_index
+        self.lexical: Optional[BM25Index] = None
+        self.metadata: Optional[MetadataColumns] = None
+        if chunks is not None:
+            self.build(chunks)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def nbytes(self) -> int:
+        """Resident bytes of the stored vectors (the re-scoring memmap is not counted)."""
+        return self.matrix.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def build(self, chunks: List[dict]) -> "VectorIndex":
+        """
+        Build the matrix from chunk dicts carrying an 'embedding' key.
+
+        :param chunks: Chunks as produced at startup; chunks without an embedding are skipped
+        :return: self
+        """
+        kept = [chunk for chunk in chunks if len(chunk.get('embedding', [])) > 0]
+        if kept:
+            matrix = np.array([chunk['embedding'] for chunk in kept], dtype=np.float32)
+        else:
+            matrix = np.empty((0, 0), dtype=np.float32)
+        self.build_from_matrix(kept, matrix)
+        self.source = chunks
+        return self
+
+    def build_from_matrix(self, chunks: List[dict], matrix: np.ndarray) -> "VectorIndex":
+        """
+        Build from a ready embedding matrix whose rows match chunks.
+
+        :param chunks: Chunk dicts; they do not need an 'embedding' key
+        :param matrix: 2D array, one row per chunk; normalized in place when already float32
+        :return: self
+        """
+        self.source = chunks
+        self.chunks = list(chunks)
+        if len(chunks):
+            normalized = self._organize(normalize_rows(np.ascontiguousarray(matrix, dtype=np.float32)))
+        else:
+            normalized = np.empty((0, 0), dtype=np.float32)
+        self._store(normalized)
+        return self
+
+    def _organize(self, matrix: np.ndarray) -> np.ndarray:
+        """Hook to reorder rows (and self.chunks) before storage; exact search keeps the order."""
+        return matrix
+
+    def _store(self, matrix: np.ndarray):
+        self.matrix, self.scales = quantize_rows(matrix, self.dtype)
+        self.full = None
+        if self.dtype != "float32" and self.rescore_candidates > 0 and matrix.size:
+            self.full = np.memmap(tempfile.TemporaryFile(), dtype=np.float32, mode="w+", shape=matrix.shape)
+            self.full[:] = matrix
+            self.full.flush()
+
+    def _dot(self, queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Scores (queries x rows) against the stored matrix, dequantizing blockwise."""
+        matrix = self.matrix if rows is None else self.matrix[rows]
+        if self.dtype == "float32":
+            return queries @ matrix.T
+        scales = None if self.scales is None else (self.scales if rows is None else self.scales[rows])
+        scores = np.empty((len(queries), len(matrix)), dtype=np.float32)
+        # A cache-sized block is upcast into one reused buffer, then multiplied
+        buffer = np.empty((min(SCORE_BLOCK_ROWS, len(matrix)), matrix.shape[1]), dtype=np.float32)
+        for start in range(0, len(matrix), SCORE_BLOCK_ROWS):
+            block = matrix[start:start + SCORE_BLOCK_ROWS]
+            upcast = buffer[:len(block)]
+            np.copyto(upcast, block, casting="unsafe")
+            scores[:, start:start + len(block)] = queries @ upcast.T
+            if scales is not None:
+                scores[:, start:start + len(block)] *= scales[start:start + len(block)]
+        return scores
+
+    def _top_rows(self, query: np.ndarray, scores: np.ndarray, top_k: int, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top rows of one query's approximate scores, re-scored exactly when enabled.
+
+        :param rows: Row indices the scores belong to; None means all rows in order
+        """
+        if self.full is None:
+            order = top_k_indices(scores, top_k)
+            return (order if rows is None else rows[order]), scores[order]
+        order = top_k_indices(scores, max(top_k, self.rescore_candidates))
+        candidates = order if rows is None else rows[order]
+        exact = self.full[candidates] @ query
+        best = top_k_indices(exact, top_k)
+        return candidates[best], exact[best]
+
+    def _prepare_queries(self, queries) -> np.ndarray:
+        queries = np.array(queries, dtype=np.float32, ndmin=2)
+        return normalize_rows(queries)
+
+    def search(self, query_embedding, top_k: int = 5) -> List[Tuple[dict, float]]:
+        """
+        Score one query against every chunk.
+
+        :param query_embedding: Query vector (list or ndarray)
+        :param top_k: Number of results to return
+        :return: List of (chunk, score) sorted by score descending
+        """
+        return self.search_batch([query_embedding], top_k)[0]
+
+    def search_batch(self, query_embeddings, top_k: int = 5) -> List[List[Tuple[dict, float]]]:
+        """
+        Score many queries with one matrix-matrix product.
+
+        :param query_embeddings: 2D array-like, one query per row
+        :param top_k: Number of results per query
+        :return: One (chunk, score) list per query
+        """
+        return [
+            [(self.chunks[i], float(score)) for i, score in zip(rows, scores)]
+            for rows, scores in self.search_rows_batch(query_embeddings, top_k)
+        ]
+
+    def search_rows_batch(self, query_embeddings, top_k: int = 5, rows: Optional[np.ndarray] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Like search_batch, but returns (row indices, scores) arrays per query.
+
+        :param rows: Optional subset of row indices to score, e.g. from a metadata filter
+        """
+        queries = self._prepare_queries(query_embeddings)
+        if not self.chunks or (rows is not None and rows.size == 0):
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in range(len(queries))]
+        scores = self._dot(queries, rows)
+        return [self._top_rows(query, row, top_k, rows) for query, row in zip(queries, scores)]
+
+    def score_rows(self, query_embedding, rows: np.ndarray) -> np.ndarray:
+        """Cosine scores of one query against the given rows."""
+        query = self._prepare_queries(query_embedding)[0]
+        if self.full is not None:
+            return self.full[rows] @ query
+        return self._dot(query[None, :], rows)[0]
+
+    def _arrays(self) -> dict:
+        arrays = {"matrix": self.matrix}
+        if self.scales is not None:
+            arrays["scales"] = self.scales
+        return arrays
+
+    def _restore(self, arrays):
+        # Loaded indexes keep their stored precision; re-scoring rows are not saved
+        self.matrix = np.ascontiguousarray(arrays["matrix"])
+        self.dtype = self.matrix.dtype.name
+        self.scales = np.asarray(arrays["scales"], dtype=np.float32) if "scales" in arrays else None
+        self.full = None
+
+    def save(self, path: str):
+        """Write the index to an .npz file; chunk embeddings are not duplicated."""
+        chunks = [{k: v for k, v in chunk.items() if k != 'embedding'} for chunk in self.chunks]
+        np.savez(path, kind=np.array(self.kind), chunks=np.array(json.dumps(chunks, ensure_ascii=False)), **self._arrays())
+
+    @classmethod
+    def load(cls, path: str) -> "VectorIndex":
+        with np.load(path, allow_pickle=False) as arrays:
+            index = INDEX_TYPES[str(arrays["kind"])]()
+            index.chunks = json.loads(str(arrays["chunks"]))
+            index._restore(arrays)
+        return index
+
+
+class IVFIndex(VectorIndex):
+    """
+    Approximate inverted-file index.
+
+    Rows are clustered with spherical k-means into nlist lists, stored
+    contiguously per list. A query only scores the rows of its nprobe
+    closest centroids; raising nprobe trades latency for recall.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, chunks: Optional[List[dict]] = None, nlist: Optional[int] = None, nprobe: Optional[int] = None, iterations: int = 10, seed: int = 0, **kwargs):
+        self.nlist = nlist or int(os.getenv("IVF_NLIST", "0"))
+        self.nprobe = nprobe or int(os.getenv("IVF_NPROBE", "8"))
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids = np.empty((0, 0), dtype=np.float32)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        super().__init__(chunks, **kwargs)
+
+    def build_from_matrix(self, chunks: List[dict], matrix: np.ndarray) -> "IVFIndex":
+        if not len(chunks):
+            self.centroids = np.empty((0, 0), dtype=np.float32)
+            self.offsets = np.zeros(1, dtype=np.int64)
+        return super().build_from_matrix(chunks, matrix)
+
+    def _organize(self, matrix: np.ndarray) -> np.ndarray:
+        return self._train(matrix)
+
+    def _assign(self, matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        # Blockwise so the score matrix stays small for large corpora
+        labels = np.empty(len(matrix), dtype=np.int64)
+        for start in range(0, len(matrix), 65536):
+            block = matrix[start:start + 65536]
+            labels[start:start + 65536] = np.argmax(block @ centroids.T, axis=1)
+        return labels
+
+    def _train(self, matrix: np.ndarray) -> np.ndarray:
+        """Cluster the float32 rows and return them grouped by list (self.chunks follows)."""
+        n = len(matrix)
+        nlist = min(self.nlist or max(1, int(np.sqrt(n))), n)
+        rng = np.random.default_rng(self.seed)
+        sample = matrix[rng.choice(n, size=min(n, nlist * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            labels = self._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = np.bincount(labels, minlength=nlist) == 0
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            centroids = normalize_rows(sums)
+
+        labels = self._assign(matrix, centroids)
+        order = np.argsort(labels, kind="stable")
+        self.chunks = [self.chunks[i] for i in order]
+        self.centroids = centroids
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=nlist))]).astype(np.int64)
+        return np.ascontiguousarray(matrix[order])
+
+    def search_batch(self, query_embeddings, top_k: int = 5, nprobe: Optional[int] = None) -> List[List[Tuple[dict, float]]]:
+        return [
+            [(self.chunks[i], float(score)) for i, score in zip(rows, scores)]
+            for rows, scores in self.search_rows_batch(query_embeddings, top_k, nprobe=nprobe)
+        ]
+
+    def search_rows_batch(self, query_embeddings, top_k: int = 5, rows: Optional[np.ndarray] = None, nprobe: Optional[int] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        if rows is not None:
+            # Filtered subsets are small; scan them exactly
+            return super().search_rows_batch(query_embeddings, top_k, rows)
+        queries = self._prepare_queries(query_embeddings)
+        if not self.chunks:
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in range(len(queries))]
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        centroid_scores = queries @ self.centroids.T
+        results = []
+        for query, row in zip(queries, centroid_scores):
+            lists = top_k_indices(row, nprobe)
+            rows = np.concatenate([np.arange(self.offsets[c], self.offsets[c + 1]) for c in lists])
+            scores = self._dot(query[None, :], rows)[0]
+            results.append(self._top_rows(query, scores, top_k, rows))
+        return results
+
+    def _arrays(self) -> dict:
+        return {**super()._arrays(), "centroids": self.centroids, "offsets": self.offsets}
+
+    def _restore(self, arrays):
+        super()._restore(arrays)
+        self.centroids = np.ascontiguousarray(arrays["centroids"], dtype=np.float32)
+        self.offsets = arrays["offsets"].astype(np.int64)
+
+
+INDEX_TYPES = {"exact": VectorIndex, "ivf": IVFIndex}
+
+
+def create_index(kind: Optional[str] = None, **kwargs) -> VectorIndex:
+    """Build an empty index of the type named by kind or RETRIEVAL_INDEX (default exact)."""
+    kind = (kind or os.getenv("RETRIEVAL_INDEX", "exact")).lower()
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown RETRIEVAL_INDEX: {kind}")
+    return INDEX_TYPES[kind](**kwargs)
 
 
 class RAG:
-    def __init__(self):
-        self.embedding_model = EmbeddingModel()
+    def __init__(self, embedding_model: Optional[EmbeddingModel] = None, reranker: Optional[CrossEncoderReranker] = None):
+        """
+        :param embedding_model: Query encoder; None uses the process-wide model from get_embedding_model()
+        :param reranker: Second-stage reranker, e.g. create_reranker(); None disables reranking
+        """
+        self.embedding_model = embedding_model if embedding_model is not None else get_embedding_model()
+        self.reranker = reranker
+        self.rerank_candidates = int(os.getenv("RERANK_CANDIDATES", "50"))
+        self.batcher = EmbeddingBatcher(self.embedding_model)
         self.data_system = os.getenv("DATA_RETRIEVEL")
-    
+        self.index = create_index()
+        self.hybrid_alpha = float(os.getenv("HYBRID_ALPHA", "0.3"))
+        self.hybrid_candidates = int(os.getenv("HYBRID_CANDIDATES", "50"))
+
     def cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
         vec1 = np.array(vec1)
         vec2 = np.array(vec2)
@@ -18,19 +451,90 @@ class RAG:
         if norm1 == 0 or norm2 == 0:
             return 0.0
         return dot_product / (norm1 * norm2)
-    
-    async def retrieve(self, data: str, embedding_model: EmbeddingModel, chunks: List[dict], top_k: int = 5) -> List[Tuple[dict, float]]:
-        query_embedding = self.embedding_model.encode(data)
-        
-        results = []
-        for chunk in chunks:
-            chunk_embedding = chunk.get('embedding', [])
-            if chunk_embedding:
-                similarity = self.cosine_similarity(query_embedding, chunk_embedding)
-                results.append((chunk, similarity))
-        
-        results.sort(key=lambda x: x[1], reverse=True)
-        return results[:top_k]
 
-        
+    def build_index(self, chunks: List[dict], matrix: Optional[np.ndarray] = None) -> VectorIndex:
+        """
+        Build and publish a new index with its lexical and metadata side structures.
+
+        :param chunks: Chunk dicts; without matrix they must carry an 'embedding'
+        :param matrix: Optional embedding matrix whose rows match chunks
+        """
+        self.index = self.prepare_index(chunks, matrix)
+        return self.index
+
+    def prepare_index(self, chunks: List[dict], matrix: Optional[np.ndarray] = None) -> VectorIndex:
+        """Like build_index, but return the index without publishing it."""
+        index = create_index()
+        if matrix is None:
+            index.build(chunks)
+        else:
+            index.build_from_matrix(chunks, matrix)
+        if self.hybrid_alpha > 0:
+            index.lexical = BM25Index([chunk.get('text', chunk.get('content', '')) for chunk in index.chunks])
+        index.metadata = MetadataColumns(index.chunks)
+        return index
+
+    def _index_for(self, chunks: Optional[List[dict]]) -> VectorIndex:
+        # Rebuild only when a different chunk list is passed in
+        if chunks is not None and chunks is not self.index.source:
+            self.build_index(chunks)
+        return self.index
+
+    async def encode_query(self, data: str, embedding_model: Optional[EmbeddingModel] = None):
+        if embedding_model is None or embedding_model is self.embedding_model:
+            return await self.batcher.encode(data)
+        return await asyncio.to_thread(embedding_model.encode, data)
+
+    async def retrieve(self, data: str, embedding_model: Optional[EmbeddingModel] = None, chunks: Optional[List[dict]] = None, top_k: int = 5, query_embedding=None, filters: Optional[dict] = None) -> List[Tuple[dict, float]]:
+        """
+        :param filters: Optional metadata filter, e.g. {"feature": "form"}; only matching chunks are scored
+        """
+        index = self._index_for(chunks)
+        if query_embedding is None:
+            query_embedding = await self.encode_query(data, embedding_model)
+        rows = index.metadata.rows(filters) if filters and index.metadata is not None else None
+        if self.reranker is None:
+            return self.hybrid_search(index, data, query_embedding, top_k, rows)
+        candidates = self.hybrid_search(index, data, query_embedding, max(top_k, self.rerank_candidates), rows)
+        return await self.reranker.rerank(data, candidates, top_k)
+
+    async def retrieve_batch(self, queries: List[str], chunks: Optional[List[dict]] = None, top_k: int = 5) -> List[List[Tuple[dict, float]]]:
+        index = self._index_for(chunks)
+        query_embeddings = await asyncio.to_thread(self.embedding_model.encode_batch, queries)
+        if index.lexical is None:
+            return index.search_batch(query_embeddings, top_k)
+        return [self.hybrid_search(index, query, embedding, top_k) for query, embedding in zip(queries, query_embeddings)]
+
+    def hybrid_search(self, index: VectorIndex, data: str, query_embedding, top_k: int = 5, rows: Optional[np.ndarray] = None) -> List[Tuple[dict, float]]:
+        """
+        Fuse dense cosine scores with BM25 scores over the chunk content.
+
+        Candidates are the top hybrid_candidates rows of each retriever. A
+        lexical match lifts the cosine score towards 1 by
+        hybrid_alpha * bm25 / max_bm25, so chunks without a lexical match
+        keep their plain cosine score and min_score keeps its meaning.
+        """
+        if index.lexical is None or self.hybrid_alpha <= 0:
+            return self._dense_search(index, query_embedding, top_k, rows)
+        candidates = max(top_k, self.hybrid_candidates)
+        lexical_all = index.lexical.scores(data)
+        if rows is not None:
+            allowed = np.zeros_like(lexical_all)
+            allowed[rows] = lexical_all[rows]
+            lexical_all = allowed
+        lexical_rows = top_k_indices(lexical_all, candidates)
+        lexical_rows = lexical_rows[lexical_all[lexical_rows] > 0]
+        if lexical_rows.size == 0:
+            return self._dense_search(index, query_embedding, top_k, rows)
+
+        dense_rows, _ = index.search_rows_batch([query_embedding], candidates, rows)[0]
+        merged = np.union1d(dense_rows, lexical_rows)
+        dense = index.score_rows(query_embedding, merged)
+        lexical = lexical_all[merged] / lexical_all[lexical_rows[0]]
+        fused = dense + self.hybrid_alpha * lexical * (1 - dense)
+        order = top_k_indices(fused, top_k)
+        return [(index.chunks[merged[i]], float(fused[i])) for i in order]
 
+    def _dense_search(self, index: VectorIndex, query_embedding, top_k: int, rows: Optional[np.ndarray]) -> List[Tuple[dict, float]]:
+        found, scores = index.search_rows_batch([query_embedding], top_k, rows)[0]
+        return [(index.chunks[i], float(score)) for i, score in zip(found, scores)]
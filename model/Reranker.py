@@ -0,0 +1,117 @@
+import os
+import time
+import asyncio
+import threading
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from dotenv import load_dotenv
+from .Metrics import REGISTRY
+
+load_dotenv()
+
+RERANK_FALLBACKS = REGISTRY.counter(
+    "chatbot_rerank_fallbacks_total",
+    "Requests served in first-stage order by reason (timeout, busy)",
+    ("reason",)
+)
+
+
+class CrossEncoderReranker:
+    """
+    Second-stage reranker over a wide, cheaply retrieved candidate set.
+
+    Pairs are scored with a local cross-encoder in batched CPU inference.
+    Scored (query, chunk) pairs are kept in an LRU cache. When scoring does
+    not finish within the latency budget, the first-stage order is returned
+    unchanged; the late scores still land in the cache for the next request.
+    Timed-out jobs keep the scoring thread busy, so while max_pending jobs
+    are already queued or running new requests skip scoring altogether
+    rather than growing a backlog that would miss its budget too.
+    """
+
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        budget_ms: Optional[float] = None,
+        cache_size: Optional[int] = None,
+        batch_size: int = 32,
+        max_pending: Optional[int] = None
+    ):
+        from sentence_transformers import CrossEncoder
+
+        self.model_name = model_name or os.getenv("RERANK_MODEL")
+        self.model = CrossEncoder(self.model_name, device="cpu")
+        self.budget = (budget_ms if budget_ms is not None else float(os.getenv("RERANK_BUDGET_MS", "150"))) / 1000
+        self.cache_size = cache_size or int(os.getenv("RERANK_CACHE_SIZE", "10000"))
+        self.batch_size = batch_size
+        self.cache: "OrderedDict[tuple, float]" = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        self.max_pending = max_pending or int(os.getenv("RERANK_MAX_PENDING", "2"))
+        # Scoring jobs submitted and not yet finished, including timed-out ones
+        self.pending = 0
+
+    def _score(self, pairs: List[Tuple[str, str]]) -> np.ndarray:
+        scores = np.asarray(self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False), dtype=np.float32)
+        with self.cache_lock:
+            for pair, score in zip(pairs, scores):
+                self.cache[pair] = float(score)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return scores
+
+    def _job_done(self, _):
+        self.pending -= 1
+
+    async def rerank(self, query: str, candidates: List[Tuple[dict, float]], top_k: int = 5) -> List[Tuple[dict, float]]:
+        """
+        Reorder candidates by cross-encoder relevance.
+
+        :param query: User's question
+        :param candidates: (chunk, score) list from the first stage, best first
+        :param top_k: Number of results to return
+        :return: top_k (chunk, first-stage score) pairs in reranked order
+        """
+        if len(candidates) <= 1:
+            return candidates[:top_k]
+        started = time.perf_counter()
+        pairs = [(query, chunk.get('text', chunk.get('content', ''))) for chunk, _ in candidates]
+        scores = {}
+        missing = []
+        with self.cache_lock:
+            for pair in pairs:
+                cached = self.cache.get(pair)
+                if cached is None:
+                    missing.append(pair)
+                else:
+                    self.cache.move_to_end(pair)
+                    scores[pair] = cached
+
+        if missing:
+            if self.pending >= self.max_pending:
+                RERANK_FALLBACKS.inc("busy")
+                return candidates[:top_k]
+            remaining = self.budget - (time.perf_counter() - started)
+            loop = asyncio.get_running_loop()
+            task = loop.run_in_executor(self.executor, self._score, missing)
+            self.pending += 1
+            task.add_done_callback(self._job_done)
+            try:
+                missing_scores = await asyncio.wait_for(asyncio.shield(task), max(remaining, 0))
+            except asyncio.TimeoutError:
+                RERANK_FALLBACKS.inc("timeout")
+                return candidates[:top_k]
+            scores.update(zip(missing, missing_scores))
+
+        # Keep the first-stage score so downstream min_score filtering is unchanged
+        order = sorted(range(len(candidates)), key=lambda i: scores[pairs[i]], reverse=True)
+        return [candidates[i] for i in order[:top_k]]
+
+
+def create_reranker() -> Optional[CrossEncoderReranker]:
+    """Load the reranker named by RERANK_MODEL, or return None when reranking is off."""
+    if not os.getenv("RERANK_MODEL"):
+        return None
+    return CrossEncoderReranker()
@@ -0,0 +1,269 @@
+import os
+import json
+import time
+import shutil
+import numpy as np
+from collections.abc import Sequence
+from typing import Callable, Dict, Optional
+from dotenv import load_dotenv
+from .BM25 import BM25Index
+from .FileLock import file_lock
+from .RAG import INDEX_TYPES, MetadataColumns, VectorIndex
+
+load_dotenv()
+
+
+class ChunkTable(Sequence):
+    """
+    Read-only chunk list over memory-mapped columns.
+
+    Texts live in one UTF-8 byte array sliced by offsets, and each metadata
+    key is an int32 code column with a small value table. Chunk dicts are
+    materialized on access, so a worker holds no per-chunk Python objects.
+    """
+
+    def __init__(self, text: np.ndarray, offsets: np.ndarray, codes: Dict[str, np.ndarray], values: Dict[str, list]):
+        self.text = text
+        self.offsets = offsets
+        self.codes = codes
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        text = self.text[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+        metadata = {key: self.values[key][self.codes[key][i]] for key in self.codes}
+        return {'text': text, 'metadata': metadata}
+
+    @staticmethod
+    def columns(chunks: Sequence) -> Dict[str, object]:
+        """Split chunk dicts into the arrays and value tables a ChunkTable is built from."""
+        encoded = [chunk.get('text', chunk.get('content', '')).encode("utf-8") for chunk in chunks]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        keys = sorted({key for chunk in chunks for key in (chunk.get('metadata') or {})})
+        codes, values = {}, {}
+        for key in keys:
+            lookup: dict = {}
+            column = [(chunk.get('metadata') or {}).get(key) for chunk in chunks]
+            codes[key] = np.array([lookup.setdefault(value, len(lookup)) for value in column], dtype=np.int32)
+            values[key] = list(lookup)
+        return {
+            "text": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            "offsets": offsets,
+            "codes": codes,
+            "values": values,
+        }
+
+
+class SharedIndexStore:
+    """
+    Generation-numbered index snapshots shared by all workers on a host.
+
+    One process builds the index and writes it as .npy arrays plus a JSON
+    manifest into ``gen-<n>/``, then points ``CURRENT`` at it. Every worker
+    memory-maps the arrays read-only, so the vectors, texts and metadata are
+    held once in the page cache however many workers attach. A build lock
+    file makes sure only one process encodes the corpus at a time. Each
+    manifest records the fingerprint (embedding model, dimension, sources)
+    it was built from, so a restart with another model or edited data
+    rebuilds instead of attaching vectors that no longer fit.
+    """
+
+    def __init__(self, directory: Optional[str] = None, keep: int = 2):
+        self.directory = directory or os.getenv("SHARED_INDEX_DIR")
+        self.keep = keep
+        self.current_path = os.path.join(self.directory, "CURRENT")
+        self.lock_path = os.path.join(self.directory, "build.lock")
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _generation_dir(self, generation: int) -> str:
+        return os.path.join(self.directory, f"gen-{generation:06d}")
+
+    def current_generation(self) -> Optional[int]:
+        try:
+            with open(self.current_path, "r", encoding="utf-8") as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def lock(self):
+        """
+        Hold the build lock. It is a kernel lock on build.lock, released when
+        the holder exits, so a crashed or slow build is never mistaken for
+        an abandoned one.
+        """
+        return file_lock(self.lock_path)
+
+    def _manifest(self, generation: int) -> dict:
+        with open(os.path.join(self._generation_dir(generation), "manifest.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def fingerprint(self, generation: Optional[int] = None) -> Optional[dict]:
+        """Fingerprint a generation (default: current) was published with; None when absent or unreadable."""
+        generation = generation if generation is not None else self.current_generation()
+        if generation is None:
+            return None
+        try:
+            return self._manifest(generation).get("fingerprint")
+        except (OSError, ValueError):
+            return None
+
+    def publish(self, index: VectorIndex, fingerprint: Optional[dict] = None) -> int:
+        """
+        Write index as the next generation and make it current; call while holding lock().
+
+        :param fingerprint: JSON-serializable identity of the build inputs, e.g. from corpus_fingerprint()
+        """
+        generation = (self.current_generation() or 0) + 1
+        target = self._generation_dir(generation)
+        staging = target + ".tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+
+        arrays = dict(index._arrays())
+        if index.full is not None:
+            arrays["full"] = index.full
+        table = ChunkTable.columns(index.chunks)
+        arrays["text"], arrays["text_offsets"] = table["text"], table["offsets"]
+        for key, codes in table["codes"].items():
+            arrays[f"meta_{key}"] = codes
+        manifest = {
+            "generation": generation,
+            "kind": index.kind,
+            "chunks": len(index.chunks),
+            "metadata": table["values"],
+            "created": time.time(),
+            "fingerprint": fingerprint,
+        }
+        if index.metadata is not None:
+            # Code columns of the filter keys are shared too; only the value tables go to JSON
+            for key in MetadataColumns.KEYS:
+                arrays[f"filter_{key}"] = index.metadata.codes[key]
+            manifest["filters"] = {key: list(index.metadata.values[key]) for key in MetadataColumns.KEYS}
+        if index.lexical is not None:
+            lexical = index.lexical
+            arrays.update(bm25_offsets=lexical.offsets, bm25_doc_ids=lexical.doc_ids, bm25_weights=lexical.weights)
+            manifest["bm25"] = {"vocabulary": lexical.vocabulary, "k1": lexical.k1, "b": lexical.b, "num_docs": lexical.num_docs}
+        manifest["arrays"] = sorted(arrays)
+
+        for name, array in arrays.items():
+            np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(array))
+        with open(os.path.join(staging, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        # Left over when a previous publish died before moving CURRENT
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(staging, target)
+
+        tmp_current = self.current_path + ".tmp"
+        with open(tmp_current, "w", encoding="utf-8") as f:
+            f.write(str(generation))
+        os.replace(tmp_current, self.current_path)
+        self._cleanup(generation)
+        print(f"Published shared index generation {generation} ({len(index.chunks)} chunks)")
+        return generation
+
+    def _cleanup(self, current: int):
+        # Older generations may still be mapped by slow workers; removal failures are fine
+        for name in os.listdir(self.directory):
+            if name.startswith("gen-") and not name.endswith(".tmp"):
+                try:
+                    generation = int(name[4:])
+                except ValueError:
+                    continue
+                if generation <= current - self.keep:
+                    shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def attach(self, generation: Optional[int] = None) -> Optional[VectorIndex]:
+        """Memory-map a published generation (default: current); None when nothing is published."""
+        generation = generation if generation is not None else self.current_generation()
+        if generation is None:
+            return None
+        directory = self._generation_dir(generation)
+        manifest = self._manifest(generation)
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in manifest["arrays"]}
+
+        index = INDEX_TYPES[manifest["kind"]]()
+        index._restore(arrays)
+        index.full = arrays.get("full")
+        index.generation = generation
+        values = manifest["metadata"]
+        index.chunks = ChunkTable(
+            arrays["text"], arrays["text_offsets"],
+            {key: arrays[f"meta_{key}"] for key in values}, values
+        )
+        index.source = index.chunks
+        if "filters" in manifest:
+            index.metadata = MetadataColumns.from_codes(
+                manifest["chunks"],
+                {key: arrays[f"filter_{key}"] for key in manifest["filters"]},
+                {key: {value: code for code, value in enumerate(table)} for key, table in manifest["filters"].items()}
+            )
+        if "bm25" in manifest:
+            bm25 = manifest["bm25"]
+            lexical = BM25Index(k1=bm25["k1"], b=bm25["b"])
+            lexical.vocabulary, lexical.num_docs = bm25["vocabulary"], bm25["num_docs"]
+            lexical.offsets, lexical.doc_ids, lexical.weights = arrays["bm25_offsets"], arrays["bm25_doc_ids"], arrays["bm25_weights"]
+            index.lexical = lexical
+        return index
+
+    def refresh(self, build: Callable[[], VectorIndex], stale_generation: Optional[int] = None, fingerprint: Optional[dict] = None) -> VectorIndex:
+        """
+        Rebuild and publish unless another process already replaced stale_generation.
+
+        Workers that lose the race for the lock wait for the winner and then
+        attach its generation instead of encoding the corpus again.
+
+        :param build: Returns a freshly built, unpublished index
+        :param stale_generation: Generation the caller wants replaced; None when nothing is published yet
+        :param fingerprint: Recorded in the manifest of the generation built here
+        :return: The current index, attached from the shared segment
+        """
+        with self.lock():
+            if self.current_generation() == stale_generation:
+                self.publish(build(), fingerprint)
+        return self.attach()
+
+    def attach_or_build(self, build: Callable[[], VectorIndex], fingerprint: Optional[dict] = None) -> VectorIndex:
+        """
+        Attach to the current generation, or build one if none exists or the
+        current one was published with a different fingerprint.
+        """
+        generation = self.current_generation()
+        if generation is not None and self.fingerprint(generation) != fingerprint:
+            print(f"Shared index generation {generation} was built from other inputs, rebuilding")
+            return self.refresh(build, generation, fingerprint)
+        return self.attach(generation) or self.refresh(build, None, fingerprint)
+
+
+def create_shared_index_store() -> Optional[SharedIndexStore]:
+    """SharedIndexStore for SHARED_INDEX_DIR, or None when workers build their own index."""
+    if not os.getenv("SHARED_INDEX_DIR"):
+        return None
+    return SharedIndexStore()
+
+
+def main():
+    """Build the corpus once and publish it as a new generation for running workers."""
+    from data.preprocessing import corpus_fingerprint, embed_chunks, iter_corpus
+    from .Embedding import get_embedding_model
+    from .RAG import RAG
+
+    store = create_shared_index_store()
+    if store is None:
+        raise SystemExit("Set SHARED_INDEX_DIR to publish a shared index")
+    embedding_model = get_embedding_model()
+    rag = RAG(embedding_model, reranker=None)
+    with store.lock():
+        store.publish(rag.prepare_index(*embed_chunks(iter_corpus(), embedding_model)), corpus_fingerprint(embedding_model))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import os
+import asyncio
+import unicodedata
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional
+from dotenv import load_dotenv
+from .Metrics import REGISTRY
+
+load_dotenv()
+
+SINGLE_FLIGHT_CALLS = REGISTRY.counter(
+    "chatbot_single_flight_calls_total",
+    "Calls through a single-flight group by outcome (leader, coalesced, overflow)",
+    ("group", "outcome")
+)
+
+
+def normalize_query(text: str) -> str:
+    """Case- and whitespace-insensitive form of a question, used as a coalescing key."""
+    return " ".join(unicodedata.normalize("NFC", text).casefold().split())
+
+
+def history_key(history: Optional[List[dict]]) -> tuple:
+    """Key for the turns before the current message; equal keys give equal prompts."""
+    return tuple((msg.get("role"), normalize_query(msg.get("content", ""))) for msg in (history or [])[:-1])
+
+
+class _Flight:
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 0
+        # Streaming flights only: deltas so far, and an event replaced on every new delta
+        self.parts: List[str] = []
+        self.updated = asyncio.Event()
+        self.finished = False
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls onto one in-flight task.
+
+    The first caller for a key starts the work; callers arriving while it
+    runs await the same task instead of repeating it. At most max_waiters
+    callers share a flight; later ones run on their own, so one hot key
+    cannot hold an unbounded crowd behind a single slow call. The task is
+    cancelled only when every caller waiting on it has gone away.
+    """
+
+    def __init__(self, name: str, max_waiters: Optional[int] = None):
+        self.name = name
+        self.max_waiters = max_waiters if max_waiters is not None else int(os.getenv("SINGLE_FLIGHT_MAX_WAITERS", "64"))
+        self.flights: Dict[Hashable, _Flight] = {}
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self.flights)
+
+    def _join(self, key: Hashable) -> Optional[_Flight]:
+        flight = self.flights.get(key)
+        if flight is None:
+            return None
+        if flight.waiters >= self.max_waiters:
+            SINGLE_FLIGHT_CALLS.inc(self.name, "overflow")
+            return None
+        flight.waiters += 1
+        self.coalesced += 1
+        SINGLE_FLIGHT_CALLS.inc(self.name, "coalesced")
+        return flight
+
+    def _start(self, key: Hashable, flight: _Flight, work: Awaitable) -> _Flight:
+        flight.waiters = 1
+        flight.task = asyncio.ensure_future(work)
+        # A key whose flight is full gets an unregistered, private one
+        if self.max_waiters > 0 and key not in self.flights:
+            self.flights[key] = flight
+            flight.task.add_done_callback(lambda _: self.flights.pop(key, None) if self.flights.get(key) is flight else None)
+            SINGLE_FLIGHT_CALLS.inc(self.name, "leader")
+        return flight
+
+    def _leave(self, flight: _Flight):
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.task.done():
+            flight.task.cancel()
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable]):
+        """
+        Await factory() once for all concurrent callers with the same key.
+
+        :param key: Hashable identity of the work, e.g. a normalized query
+        :param factory: Called only by the leader; returns the awaitable to share
+        :return: The shared result; exceptions are raised to every caller
+        """
+        flight = self._join(key) if self.max_waiters > 0 else None
+        if flight is None:
+            flight = self._start(key, _Flight(), factory())
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            self._leave(flight)
+
+    async def stream(self, key: Hashable, factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """
+        Streaming variant of run: every caller receives all deltas of one shared stream.
+
+        Callers that join late first replay the deltas produced so far.
+        """
+        flight = self._join(key) if self.max_waiters > 0 else None
+        if flight is None:
+            flight = _Flight()
+            self._start(key, flight, self._produce(flight, factory))
+        try:
+            index = 0
+            while True:
+                updated = flight.updated
+                while index < len(flight.parts):
+                    yield flight.parts[index]
+                    index += 1
+                if flight.finished:
+                    # Re-raises the producer's error, if any
+                    await asyncio.shield(flight.task)
+                    if index >= len(flight.parts):
+                        return
+                    continue
+                await updated.wait()
+        finally:
+            self._leave(flight)
+
+    async def _produce(self, flight: _Flight, factory: Callable[[], AsyncIterator[str]]):
+        try:
+            async for part in factory():
+                flight.parts.append(part)
+                flight.updated.set()
+                flight.updated = asyncio.Event()
+        finally:
+            flight.finished = True
+            flight.updated.set()
@@ -0,0 +1,50 @@
+import os
+import time
+from typing import Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class StartupState:
+    """
+    Phases of the background warm-up, for /ready and request gating.
+
+    The server binds its port before any model is loaded; warm-up then walks
+    through the phases below and ends in "ready" or "failed". Requests that
+    arrive earlier are turned away with a 503 and a Retry-After hint.
+    """
+
+    PHASES = ("starting", "loading_embedding_model", "loading_reranker", "loading_llm", "building_index", "ready")
+
+    def __init__(self, retry_after: Optional[int] = None):
+        self.phase = "starting"
+        self.error: Optional[str] = None
+        self.started = time.perf_counter()
+        self.phase_started = self.started
+        self.durations: Dict[str, float] = {}
+        self.retry_after = retry_after or int(os.getenv("STARTUP_RETRY_AFTER", "5"))
+
+    @property
+    def ready(self) -> bool:
+        return self.phase == "ready"
+
+    def enter(self, phase: str):
+        now = time.perf_counter()
+        self.durations[self.phase] = round(now - self.phase_started, 3)
+        self.phase = phase
+        self.phase_started = now
+        print(f"Startup phase: {phase} ({now - self.started:.1f}s)")
+
+    def finish(self):
+        self.enter("ready")
+
+    def fail(self, error: Exception):
+        self.error = f"{type(error).__name__}: {error}"
+        self.enter("failed")
+
+    def status(self) -> dict:
+        status = {"status": "ready" if self.ready else self.phase, "phase": self.phase, "durations": self.durations}
+        if self.error:
+            status["error"] = self.error
+        return status
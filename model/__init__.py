@@ -1,4 +1,17 @@
 # Model package
-from .Embedding import EmbeddingModel
-from .RAG import RAG
+from .Embedding import EmbeddingModel, get_embedding_model
+from .RAG import RAG, VectorIndex, IVFIndex, MetadataColumns, create_index
 from .LLM import GeminiLLM
+from .EmbeddingStore import EmbeddingStore
+from .EmbeddingBatcher import EmbeddingBatcher
+from .AnswerCache import SemanticCache
+from .ConversationStore import ConversationStore, InMemoryConversationStore, SQLiteConversationStore, create_conversation_store
+from .BM25 import BM25Index
+from .Prompt import PromptBuilder, count_tokens
+from .Reranker import CrossEncoderReranker, create_reranker
+from .Metrics import REGISTRY, Tracer, RequestTrace
+from .Startup import StartupState
+from .SharedIndex import SharedIndexStore, ChunkTable, create_shared_index_store
+from .SingleFlight import SingleFlight
+from .FAQ import FAQIndex, FAQMatch
+from .Admission import AdmissionController, AdmissionRejected, ClientGone
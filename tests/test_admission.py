@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+
+from model.Admission import AdmissionController, AdmissionRejected, ClientGone
+
+
+def controller(**kwargs) -> AdmissionController:
+    options = dict(max_concurrent=1, max_queue=4, deadline=5, rate=0, session_rate=0)
+    options.update(kwargs)
+    admission = AdmissionController(**options)
+    admission.poll_interval = 0.01
+    return admission
+
+
+async def queued(admission: AdmissionController, count: int):
+    """Wait until count requests are waiting for a slot."""
+    while admission.queued < count:
+        await asyncio.sleep(0)
+
+
+def test_release_hands_slot_to_next_waiter():
+    async def main():
+        admission = controller()
+        first = await admission.acquire()
+        waiter = asyncio.create_task(admission.acquire())
+        await queued(admission, 1)
+        admission.release(first)
+        second = await waiter
+        assert admission.running == 1 and admission.queued == 0
+        admission.release(second)
+        assert admission.running == 0
+
+    asyncio.run(main())
+
+
+def test_waiter_giving_up_leaves_queue():
+    async def main():
+        admission = controller()
+        first = await admission.acquire()
+        waiter = asyncio.create_task(admission.acquire())
+        await queued(admission, 1)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert admission.queued == 0
+        admission.release(first)
+        assert admission.running == 0
+
+    asyncio.run(main())
+
+
+def test_slot_handed_to_leaving_waiter_is_passed_on():
+    async def main():
+        admission = controller()
+        first = await admission.acquire()
+
+        async def is_disconnected():
+            # The slot reaches this waiter in the same step its client goes away
+            admission.release(first)
+            return True
+
+        leaving = asyncio.create_task(admission.acquire(is_disconnected=is_disconnected))
+        await queued(admission, 1)
+        next_waiter = asyncio.create_task(admission.acquire())
+        await queued(admission, 2)
+        with pytest.raises(ClientGone):
+            await asyncio.wait_for(leaving, 1)
+        started = await asyncio.wait_for(next_waiter, 1)
+        assert admission.running == 1 and admission.queued == 0
+        admission.release(started)
+        assert admission.running == 0
+
+    asyncio.run(main())
+
+
+def test_disconnected_client_is_dropped_from_queue():
+    async def main():
+        admission = controller()
+        first = await admission.acquire()
+        connected = True
+
+        async def is_disconnected():
+            return not connected
+
+        waiter = asyncio.create_task(admission.acquire(is_disconnected=is_disconnected))
+        await queued(admission, 1)
+        connected = False
+        with pytest.raises(ClientGone):
+            await asyncio.wait_for(waiter, 1)
+        assert admission.queued == 0
+        admission.release(first)
+        assert admission.running == 0
+
+    asyncio.run(main())
+
+
+def test_full_queue_is_rejected_with_503():
+    async def main():
+        admission = controller(max_queue=1)
+        first = await admission.acquire()
+        waiter = asyncio.create_task(admission.acquire())
+        await queued(admission, 1)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire()
+        assert rejected.value.status_code == 503
+        assert rejected.value.outcome == "queue_full"
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        admission.release(first)
+
+    asyncio.run(main())
+
+
+def test_waiter_times_out_after_deadline():
+    async def main():
+        admission = controller(deadline=0.05)
+        first = await admission.acquire()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire()
+        assert rejected.value.outcome == "timeout"
+        assert admission.queued == 0
+        admission.release(first)
+        assert admission.running == 0
+
+    asyncio.run(main())
+
+
+def test_session_rate_limit_answers_429():
+    async def main():
+        admission = controller(max_concurrent=10, session_rate=1, session_burst=1)
+        started = await admission.acquire("session")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire("session")
+        assert rejected.value.status_code == 429
+        assert rejected.value.retry_after >= 1
+        # Other sessions have their own bucket
+        admission.release(await admission.acquire("other"))
+        admission.release(started)
+
+    asyncio.run(main())
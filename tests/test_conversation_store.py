@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+import pytest
+
+from model.ConversationStore import ConversationStore, InMemoryConversationStore, SQLiteConversationStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    def make(**kwargs) -> ConversationStore:
+        if request.param == "sqlite":
+            return SQLiteConversationStore(str(tmp_path / "conversations.db"), **kwargs)
+        return InMemoryConversationStore(**kwargs)
+    return make
+
+
+def turn(message: str, answer: str):
+    return [{"role": "user", "content": message}, {"role": "assistant", "content": answer}]
+
+
+def test_history_keeps_newest_messages(make_store):
+    store = make_store(max_messages=3)
+    store.extend("s1", turn("one", "1"))
+    store.extend("s1", turn("two", "2"))
+    assert store.get_history("s1") == [
+        {"role": "assistant", "content": "1"},
+        {"role": "user", "content": "two"},
+        {"role": "assistant", "content": "2"},
+    ]
+    assert store.get_history("other") == []
+
+
+def test_async_methods_match_sync_ones(make_store):
+    store = make_store()
+
+    async def main():
+        await store.extend_async("s1", turn("hi", "hello"))
+        return await store.get_history_async("s1")
+
+    assert asyncio.run(main()) == turn("hi", "hello")
+
+
+def test_idle_session_expires_without_further_writes(make_store):
+    store = make_store(idle_ttl=0.2)
+    store.extend("s1", turn("hi", "hello"))
+    time.sleep(0.3)
+    assert store.get_history("s1") == []
+    assert len(store) == 0
+
+
+def test_expired_session_is_not_revived_by_next_write(make_store):
+    store = make_store(idle_ttl=0.2)
+    store.extend("s1", turn("old", "old answer"))
+    time.sleep(0.3)
+    store.extend("s1", turn("new", "new answer"))
+    assert store.get_history("s1") == turn("new", "new answer")
+
+
+def test_least_recently_used_sessions_are_evicted(make_store):
+    store = make_store(max_sessions=3)
+    for i in range(5):
+        store.extend(f"s{i}", turn(f"q{i}", f"a{i}"))
+    assert len(store) == 3
+    assert store.get_history("s0") == []
+    assert store.get_history("s4") == turn("q4", "a4")
+
+
+def test_clear_removes_session(make_store):
+    store = make_store()
+    store.extend("s1", turn("hi", "hello"))
+    store.clear("s1")
+    assert store.get_history("s1") == []
+
+
+def test_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        ConversationStore()
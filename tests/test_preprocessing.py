@@ -0,0 +1,35 @@
+import pytest
+
+from data.preprocessing import split_chunk
+
+
+def long_chunk(words: int, title: str = "Reset password"):
+    content = " ".join(f"w{i}" for i in range(words))
+    return {"content": content, "metadata": {"header": "Guide", "title": title}}
+
+
+def test_parts_stay_within_max_tokens():
+    parts = list(split_chunk(long_chunk(1000), max_tokens=300, overlap=50))
+    assert len(parts) > 1
+    assert all(len(part["content"].split()) <= 300 for part in parts)
+    assert all(part["content"].startswith("Reset password\n") for part in parts[1:])
+
+
+def test_parts_cover_content_with_overlap():
+    parts = list(split_chunk(long_chunk(1000), max_tokens=300, overlap=50))
+    bodies = [part["content"].split()[0 if i == 0 else 2:] for i, part in enumerate(parts)]
+    assert bodies[0][-50:] == bodies[1][:50]
+    assert bodies[-1][-1] == "w999"
+    assert [part["metadata"]["part"] for part in parts] == list(range(len(parts)))
+
+
+def test_title_longer_than_room_is_not_prefixed():
+    title = " ".join(["long"] * 260)
+    parts = list(split_chunk(long_chunk(1000, title), max_tokens=300, overlap=50))
+    assert all(len(part["content"].split()) <= 300 for part in parts)
+    assert not parts[1]["content"].startswith("long")
+
+
+def test_overlap_must_be_smaller_than_max_tokens():
+    with pytest.raises(ValueError):
+        list(split_chunk(long_chunk(10), max_tokens=5, overlap=5))
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from benchmarks.fakes import FakeEmbeddingModel
+from model.RAG import RAG, VectorIndex
+
+
+def test_reranker_is_only_used_when_passed(monkeypatch):
+    # A configured RERANK_MODEL must not be loaded behind an explicit None
+    monkeypatch.setenv("RERANK_MODEL", "not-a-real-model")
+    rag = RAG(FakeEmbeddingModel(dim=16), reranker=None)
+    assert rag.reranker is None
+    assert RAG(FakeEmbeddingModel(dim=16)).reranker is None
+
+
+def test_int8_index_matches_float32_ranking():
+    rng = np.random.default_rng(0)
+    matrix = rng.standard_normal((3000, 32)).astype(np.float32)
+    chunks = [{"id": i} for i in range(len(matrix))]
+    exact = VectorIndex(dtype="float32").build_from_matrix(chunks, matrix.copy())
+    compact = VectorIndex(dtype="int8", rescore_candidates=20).build_from_matrix(chunks, matrix.copy())
+    assert compact.nbytes < exact.nbytes / 3
+    query = matrix[42]
+    assert [chunk["id"] for chunk, _ in compact.search(query, 5)] == [chunk["id"] for chunk, _ in exact.search(query, 5)]
+
+
+def test_float16_storage_is_rejected():
+    with pytest.raises(ValueError, match="float16"):
+        VectorIndex(dtype="float16")
@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+
+from benchmarks.fakes import FakeEmbeddingModel
+from data.preprocessing import corpus_fingerprint
+from model.RAG import MetadataColumns, create_index
+from model.SharedIndex import SharedIndexStore
+
+
+def build_index(embedding: FakeEmbeddingModel, texts):
+    chunks = [{"text": text, "metadata": {"header": "Guide", "title": text.split(".")[0]}} for text in texts]
+    index = create_index("exact")
+    index.build_from_matrix(chunks, embedding.encode_batch(texts))
+    index.metadata = MetadataColumns(index.chunks)
+    return index
+
+
+def data_source(tmp_path, monkeypatch, text: str = "## Guide\nReset your password from the login page.\n"):
+    path = tmp_path / "system.md"
+    path.write_text(text, encoding="utf-8")
+    monkeypatch.setenv("SYSTEM_DATA_PATH", str(path))
+    monkeypatch.delenv("NORMAL_QUESTION_DATA_PATH", raising=False)
+    return path
+
+
+def test_publish_then_attach_round_trip(tmp_path, monkeypatch):
+    data_source(tmp_path, monkeypatch)
+    embedding = FakeEmbeddingModel(dim=64)
+    store = SharedIndexStore(str(tmp_path / "shared"))
+    texts = ["Reset your password. Use the login page.", "Add a household member. Open the form."]
+    fingerprint = corpus_fingerprint(embedding)
+    builds = []
+
+    def build():
+        builds.append(1)
+        return build_index(embedding, texts)
+
+    first = store.attach_or_build(build, fingerprint)
+    second = store.attach_or_build(build, fingerprint)
+    assert len(builds) == 1
+    assert second.generation == first.generation == 1
+    assert [chunk["text"] for chunk in second.chunks] == texts
+    assert store.fingerprint() == fingerprint
+    query = embedding.encode_batch(["Reset your password"], normalize=True)[0]
+    assert np.allclose(first.search(query, 2)[0][1], second.search(query, 2)[0][1])
+
+
+def test_other_embedding_model_rebuilds(tmp_path, monkeypatch):
+    data_source(tmp_path, monkeypatch)
+    store = SharedIndexStore(str(tmp_path / "shared"))
+    texts = ["Reset your password. Use the login page."]
+    old = FakeEmbeddingModel(dim=64)
+    store.attach_or_build(lambda: build_index(old, texts), corpus_fingerprint(old))
+
+    new = FakeEmbeddingModel(dim=32)
+    index = store.attach_or_build(lambda: build_index(new, texts), corpus_fingerprint(new))
+    assert index.generation == 2
+    assert store.fingerprint()["dim"] == 32
+    index.search(new.encode_batch(["password"], normalize=True)[0], 1)
+
+
+def test_edited_sources_rebuild(tmp_path, monkeypatch):
+    path = data_source(tmp_path, monkeypatch)
+    embedding = FakeEmbeddingModel(dim=64)
+    store = SharedIndexStore(str(tmp_path / "shared"))
+    store.attach_or_build(lambda: build_index(embedding, ["Old text."]), corpus_fingerprint(embedding))
+
+    path.write_text("## Guide\nNew text.\n", encoding="utf-8")
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+    index = store.attach_or_build(lambda: build_index(embedding, ["New text."]), corpus_fingerprint(embedding))
+    assert index.generation == 2
+    assert [chunk["text"] for chunk in index.chunks] == ["New text."]
+
+
+def test_generation_without_fingerprint_is_rebuilt(tmp_path, monkeypatch):
+    data_source(tmp_path, monkeypatch)
+    embedding = FakeEmbeddingModel(dim=64)
+    store = SharedIndexStore(str(tmp_path / "shared"))
+    with store.lock():
+        store.publish(build_index(embedding, ["Old text."]))
+    index = store.attach_or_build(lambda: build_index(embedding, ["Old text."]), corpus_fingerprint(embedding))
+    assert index.generation == 2
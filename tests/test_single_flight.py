@@ -0,0 +1,162 @@
+import asyncio
+
+import pytest
+
+from model.SingleFlight import SingleFlight, history_key, normalize_query
+
+
+def test_concurrent_calls_share_one_result():
+    async def main():
+        flight = SingleFlight("test")
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        results = await asyncio.gather(*(flight.run("key", work) for _ in range(5)))
+        assert results == ["answer"] * 5
+        assert calls == 1
+        assert flight.coalesced == 4
+        assert len(flight) == 0
+
+    asyncio.run(main())
+
+
+def test_leaving_waiter_does_not_cancel_shared_work():
+    async def main():
+        flight = SingleFlight("test")
+        started = asyncio.Event()
+
+        async def work():
+            started.set()
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        leader = asyncio.create_task(flight.run("key", work))
+        await started.wait()
+        follower = asyncio.create_task(flight.run("key", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await follower == "answer"
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+    asyncio.run(main())
+
+
+def test_work_is_cancelled_when_every_waiter_leaves():
+    async def main():
+        flight = SingleFlight("test")
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def work():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        callers = [asyncio.create_task(flight.run("key", work)) for _ in range(3)]
+        await started.wait()
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.wait_for(cancelled.wait(), 1)
+        await asyncio.sleep(0)
+        assert len(flight) == 0
+
+    asyncio.run(main())
+
+
+def test_errors_reach_every_caller():
+    async def main():
+        flight = SingleFlight("test")
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(*(flight.run("key", work) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+    asyncio.run(main())
+
+
+def test_full_flight_overflows_to_private_call():
+    async def main():
+        flight = SingleFlight("test", max_waiters=2)
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return calls
+
+        await asyncio.gather(*(flight.run("key", work) for _ in range(3)))
+        assert calls == 2
+
+    asyncio.run(main())
+
+
+def test_late_stream_joiner_replays_earlier_deltas():
+    async def main():
+        flight = SingleFlight("test")
+        first_sent = asyncio.Event()
+        release = asyncio.Event()
+        calls = 0
+
+        async def produce():
+            nonlocal calls
+            calls += 1
+            yield "a"
+            first_sent.set()
+            await release.wait()
+            yield "b"
+            yield "c"
+
+        async def consume():
+            return [delta async for delta in flight.stream("key", produce)]
+
+        early = asyncio.create_task(consume())
+        await first_sent.wait()
+        late = asyncio.create_task(consume())
+        await asyncio.sleep(0)
+        release.set()
+        assert await early == ["a", "b", "c"]
+        assert await late == ["a", "b", "c"]
+        assert calls == 1
+
+    asyncio.run(main())
+
+
+def test_stream_error_reaches_every_consumer():
+    async def main():
+        flight = SingleFlight("test")
+
+        async def produce():
+            yield "a"
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        async def consume():
+            parts = []
+            with pytest.raises(RuntimeError):
+                async for delta in flight.stream("key", produce):
+                    parts.append(delta)
+            return parts
+
+        assert await asyncio.gather(consume(), consume()) == [["a"], ["a"]]
+
+    asyncio.run(main())
+
+
+def test_keys_ignore_case_spacing_and_current_message():
+    assert normalize_query("  How do I  RESET? ") == normalize_query("how do i reset?")
+    history = [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello"}]
+    assert history_key(history + [{"role": "user", "content": "one"}]) == history_key(history + [{"role": "user", "content": "two"}])